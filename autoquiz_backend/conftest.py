@@ -0,0 +1,6 @@
+# conftest.py - Point the app at a throwaway database before any test imports it
+import os
+import tempfile
+
+# The app reads its database settings at import time
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/autoforms.db"
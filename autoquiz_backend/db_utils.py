@@ -1,26 +1,56 @@
 # db_utils.py
 import os
-from sqlalchemy import create_engine
+import time
+import random
+import argparse
+from sqlalchemy import func, insert, text
 from sqlalchemy.orm import sessionmaker
-from models import Base, QuizDB, QuestionDB, QuizStatus
+from models import Base, QuizDB, FormStatus, QUIZ_SEARCH_BACKFILL, quiz_search_table, QuestionBankDB, QuizQuestionDB, QuizStatus, SessionLocal, create_database_engine, question_content_hash
+from maintenance import create_snapshot, list_snapshots, prune_snapshots, restore_snapshot, run_purge, vacuum_database
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
 
 def init_db(db_path="./autoforms.db"):
     """Initialize the database and return a session"""
-    # Remove existing database if needed
+    # Snapshot the existing database before removing it
     if os.path.exists(db_path) and db_path != ":memory:":
+        create_snapshot(db_path)
         os.remove(db_path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
     
     # Create database
-    engine = create_engine(f"sqlite:///{db_path}")
+    engine = create_database_engine(f"sqlite:///{db_path}")
     Base.metadata.create_all(engine)
     
     # Create session
     SessionLocal = sessionmaker(bind=engine)
     return SessionLocal()
 
+def rebuild_search_index(db):
+    """Repopulate the quiz_search full-text index from the quizzes and their questions"""
+    if db.get_bind().dialect.name != "sqlite":
+        return
+    db.execute(text("DELETE FROM quiz_search"))
+    db.execute(text(QUIZ_SEARCH_BACKFILL))
+    db.commit()
+
+def get_or_create_bank_question(db, text, options, correct_answer_index):
+    """Find a question in the question bank by content, adding it if it's new"""
+    content_hash = question_content_hash(text, options, correct_answer_index)
+    question = db.query(QuestionBankDB).filter(QuestionBankDB.content_hash == content_hash).first()
+    if not question:
+        question = QuestionBankDB(
+            content_hash=content_hash,
+            text=text,
+            options=options,
+            correct_answer_index=correct_answer_index
+        )
+        db.add(question)
+    return question
+
 def seed_sample_data(db):
     """Seed the database with sample quizzes"""
     # Sample Quiz 1
@@ -32,6 +62,7 @@ def seed_sample_data(db):
         status=QuizStatus.DRAFT,
         form_id="sample1",
         form_url="https://docs.google.com/forms/d/sample1/edit",
+        form_status=FormStatus.READY,
         created_at=datetime.now(),
         updated_at=datetime.now()
     )
@@ -39,28 +70,36 @@ def seed_sample_data(db):
     db.add(quiz1)
     
     # Questions for Quiz 1
-    q1 = QuestionDB(
+    q1 = QuizQuestionDB(
         quiz_id=quiz1_id,
-        text="What is Python?",
-        options=json.dumps([
-            "A programming language", 
-            "A snake", 
-            "A game", 
-            "An operating system"
-        ]),
-        correct_answer_index=0
+        position=0,
+        question=get_or_create_bank_question(
+            db,
+            text="What is Python?",
+            options=json.dumps([
+                "A programming language", 
+                "A snake", 
+                "A game", 
+                "An operating system"
+            ]),
+            correct_answer_index=0
+        )
     )
     
-    q2 = QuestionDB(
+    q2 = QuizQuestionDB(
         quiz_id=quiz1_id,
-        text="Which symbol is used for comments in Python?",
-        options=json.dumps([
-            "//", 
-            "/*", 
-            "#", 
-            "--"
-        ]),
-        correct_answer_index=2
+        position=1,
+        question=get_or_create_bank_question(
+            db,
+            text="Which symbol is used for comments in Python?",
+            options=json.dumps([
+                "//", 
+                "/*", 
+                "#", 
+                "--"
+            ]),
+            correct_answer_index=2
+        )
     )
     
     db.add(q1)
@@ -75,6 +114,7 @@ def seed_sample_data(db):
         status=QuizStatus.APPROVED,
         form_id="sample2",
         form_url="https://docs.google.com/forms/d/sample2/edit",
+        form_status=FormStatus.READY,
         created_at=datetime.now(),
         updated_at=datetime.now()
     )
@@ -82,28 +122,36 @@ def seed_sample_data(db):
     db.add(quiz2)
     
     # Questions for Quiz 2
-    q3 = QuestionDB(
+    q3 = QuizQuestionDB(
         quiz_id=quiz2_id,
-        text="What is JavaScript primarily used for?",
-        options=json.dumps([
-            "Server-side programming", 
-            "Web development", 
-            "Mobile app development", 
-            "Database management"
-        ]),
-        correct_answer_index=1
+        position=0,
+        question=get_or_create_bank_question(
+            db,
+            text="What is JavaScript primarily used for?",
+            options=json.dumps([
+                "Server-side programming", 
+                "Web development", 
+                "Mobile app development", 
+                "Database management"
+            ]),
+            correct_answer_index=1
+        )
     )
     
-    q4 = QuestionDB(
+    q4 = QuizQuestionDB(
         quiz_id=quiz2_id,
-        text="Which keyword is used to declare variables in JavaScript?",
-        options=json.dumps([
-            "dim", 
-            "var", 
-            "variable", 
-            "declare"
-        ]),
-        correct_answer_index=1
+        position=1,
+        question=get_or_create_bank_question(
+            db,
+            text="Which keyword is used to declare variables in JavaScript?",
+            options=json.dumps([
+                "dim", 
+                "var", 
+                "variable", 
+                "declare"
+            ]),
+            correct_answer_index=1
+        )
     )
     
     db.add(q3)
@@ -111,11 +159,252 @@ def seed_sample_data(db):
     
     # Commit changes
     db.commit()
+    rebuild_search_index(db)
     
     return [quiz1_id, quiz2_id]
 
+# Vocabulary the synthetic dataset is built from
+GENERATOR_WORDS = (
+    "python javascript function variable loop class object array string number boolean "
+    "module package import return value type error exception list dict tuple set index "
+    "query database table column row key join filter sort cache memory thread process "
+    "network request response server client protocol header cookie token session file "
+    "stream buffer byte encoding parser compiler runtime syntax scope closure callback "
+    "promise async await event handler interface method property attribute instance"
+).split()
+
+# Reference time generated timestamps count back from, so a seed always gives the same rows
+GENERATOR_NOW = datetime(2025, 1, 1)
+
+def parse_range(value):
+    """Parse "MIN:MAX" (or a single number) into an inclusive (min, max) pair"""
+    low, _, high = value.partition(":")
+    low, high = int(low), int(high or low)
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"invalid range {value}, expected MIN:MAX")
+    return low, high
+
+def parse_weights(value):
+    """Parse "draft=0.6,approved=0.3,deleted=0.1" into status weights"""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        try:
+            weights[QuizStatus(name.strip().lower())] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid status weight {part}, expected status=weight")
+    return weights
+
+def parse_datetime(value):
+    """Parse an ISO 8601 date or datetime, e.g. 2025-01-01 or 2025-01-01T12:00:00"""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {value}, expected ISO 8601")
+
+def bulk_insert_rows(connection, table, columns, rows):
+    """
+    Insert tuples into a table with one executemany
+
+    SQLite gets the rows straight through the driver cursor, skipping
+    SQLAlchemy's per-row parameter processing; other backends go through Core.
+    Only suitable for columns that need no type conversion.
+    """
+    if not rows:
+        return
+    if connection.dialect.name == "sqlite":
+        placeholders = ", ".join("?" for _ in columns)
+        cursor = connection.connection.dbapi_connection.cursor()
+        cursor.executemany(f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        cursor.close()
+    else:
+        connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+def generate_dataset(
+    db,
+    quizzes=1000,
+    seed=0,
+    questions=(5, 20),
+    options=(2, 5),
+    option_words=(1, 6),
+    question_words=(6, 16),
+    statuses=None,
+    days=365,
+    shared=0.2,
+    batch_size=2000,
+    now=GENERATOR_NOW
+):
+    """
+    Add reproducible synthetic quizzes to the database for load testing
+
+    Rows go in with bulk executemany inserts, `batch_size` quizzes per
+    transaction, with bank IDs assigned up front so links never have to look
+    them up. A `shared` fraction of questions repeats earlier ones to exercise
+    the question bank's deduplication. The search index is filled in for the
+    new quizzes as they go in. Creation times fall in the `days` before `now`.
+    Quiz IDs come from the seed, so a seed can only be loaded into a database
+    once; a repeated seed raises ValueError. Returns (quizzes, questions, bank
+    rows) inserted.
+    """
+    first_quiz_id = str(uuid.UUID(int=random.Random(seed).getrandbits(128), version=4))
+    if quizzes > 0 and db.get(QuizDB, first_quiz_id) is not None:
+        raise ValueError(f"Seed {seed} has already been generated into this database, use a different --seed")
+    
+    rng = random.Random(seed)
+    statuses = statuses or {QuizStatus.DRAFT: 0.6, QuizStatus.APPROVED: 0.3, QuizStatus.DELETED: 0.1}
+    status_choices, status_weights = list(statuses), list(statuses.values())
+    index_search = db.get_bind().dialect.name == "sqlite"
+    
+    next_question_id = (db.query(func.max(QuestionBankDB.id)).scalar() or 0) + 1
+    known_hashes = {}
+    question_texts = {}
+    for question_id, content_hash, text_value in db.query(QuestionBankDB.id, QuestionBankDB.content_hash, QuestionBankDB.text):
+        known_hashes[content_hash] = question_id
+        question_texts[question_id] = text_value
+    reusable_ids = list(question_texts)
+    
+    def count(count_range):
+        low, high = count_range
+        return low + int(rng.random() * (high - low + 1))
+    
+    def words(count_range):
+        return " ".join(rng.choices(GENERATOR_WORDS, k=count(count_range)))
+    
+    total_quizzes = total_links = total_bank = 0
+    while total_quizzes < quizzes:
+        quiz_rows, bank_rows, link_rows, search_rows = [], [], [], []
+        for _ in range(min(batch_size, quizzes - total_quizzes)):
+            quiz_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            created_at = now - timedelta(seconds=rng.uniform(0, days * 86400))
+            status = rng.choices(status_choices, status_weights)[0]
+            updated_at = created_at
+            if status != QuizStatus.DRAFT:
+                updated_at = created_at + (now - created_at) * rng.random()
+            title = words((2, 6)).capitalize() + " quiz"
+            description = words((5, 20)).capitalize()
+            quiz_rows.append({
+                "id": quiz_id,
+                "title": title,
+                "description": description,
+                "status": status,
+                "created_at": created_at,
+                "updated_at": updated_at
+            })
+            
+            quiz_question_ids = []
+            for position in range(count(questions)):
+                if reusable_ids and rng.random() < shared:
+                    question_id = rng.choice(reusable_ids)
+                else:
+                    option_list = [words(option_words) for _ in range(max(count(options), 1))]
+                    text_value = words(question_words).capitalize() + "?"
+                    options_json = json.dumps(option_list)
+                    correct_answer_index = rng.randrange(len(option_list))
+                    content_hash = question_content_hash(text_value, options_json, correct_answer_index)
+                    question_id = known_hashes.get(content_hash)
+                    if question_id is None:
+                        question_id = known_hashes[content_hash] = next_question_id
+                        next_question_id += 1
+                        question_texts[question_id] = text_value
+                        reusable_ids.append(question_id)
+                        bank_rows.append((question_id, content_hash, text_value, options_json, correct_answer_index))
+                link_rows.append((quiz_id, position, question_id))
+                quiz_question_ids.append(question_id)
+            search_rows.append((
+                quiz_id, title, description, "\n".join(question_texts[question_id] for question_id in quiz_question_ids)
+            ))
+        
+        connection = db.connection()
+        connection.execute(insert(QuizDB.__table__), quiz_rows)
+        bulk_insert_rows(
+            connection, QuestionBankDB.__table__,
+            ("id", "content_hash", "text", "options", "correct_answer_index"), bank_rows
+        )
+        bulk_insert_rows(connection, QuizQuestionDB.__table__, ("quiz_id", "position", "question_id"), link_rows)
+        if index_search:
+            bulk_insert_rows(connection, quiz_search_table, ("quiz_id", "title", "description", "questions"), search_rows)
+        db.commit()
+        total_quizzes += len(quiz_rows)
+        total_links += len(link_rows)
+        total_bank += len(bank_rows)
+        print(f"Generated {total_quizzes}/{quizzes} quizzes, {total_links} questions")
+    
+    return total_quizzes, total_links, total_bank
+
 if __name__ == "__main__":
-    # If run directly, initialize and seed the database
-    db = init_db()
-    seed_sample_data(db)
-    print("Database initialized and seeded with sample data.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="AutoQuiz database utilities")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("seed", help="Recreate the database with sample quizzes (the default)")
+    commands.add_parser("reindex", help="Rebuild the full-text search index from the quizzes")
+    commands.add_parser("snapshot", help="Take an online snapshot of the database and prune old ones")
+    commands.add_parser("snapshots", help="List the database snapshots, newest first")
+    restore = commands.add_parser("restore", help="Copy a snapshot back over the database")
+    restore.add_argument("name", help="File name of the snapshot, as listed by `snapshots`")
+    purge = commands.add_parser("purge", help="Permanently remove quizzes deleted longer ago than the retention period")
+    purge.add_argument("--retention-days", type=int, default=None, help="Override PURGE_RETENTION_DAYS")
+    commands.add_parser("vacuum", help="Rebuild the database file and enable incremental vacuuming")
+    generate = commands.add_parser("generate", help="Add reproducible synthetic quizzes for load testing")
+    generate.add_argument("quizzes", type=int, help="Number of quizzes to generate")
+    generate.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data")
+    generate.add_argument("--questions", type=parse_range, default=(5, 20), help="Questions per quiz, MIN:MAX")
+    generate.add_argument("--options", type=parse_range, default=(2, 5), help="Options per question, MIN:MAX")
+    generate.add_argument("--option-words", type=parse_range, default=(1, 6), help="Words per option, MIN:MAX")
+    generate.add_argument("--question-words", type=parse_range, default=(6, 16), help="Words per question, MIN:MAX")
+    generate.add_argument(
+        "--statuses", type=parse_weights, default=None,
+        help="Relative status weights, e.g. draft=0.6,approved=0.3,deleted=0.1"
+    )
+    generate.add_argument("--days", type=int, default=365, help="Spread creation times over this many days before --now")
+    generate.add_argument(
+        "--now", type=parse_datetime, default=GENERATOR_NOW,
+        help=f"Reference time for generated timestamps (default {GENERATOR_NOW:%Y-%m-%d})"
+    )
+    generate.add_argument("--shared", type=float, default=0.2, help="Fraction of questions reused from earlier quizzes")
+    generate.add_argument("--batch-size", type=int, default=2000, help="Quizzes inserted per transaction")
+    args = parser.parse_args()
+    
+    if args.command == "generate":
+        started = time.perf_counter()
+        try:
+            counts = generate_dataset(
+                SessionLocal(),
+                quizzes=args.quizzes,
+                seed=args.seed,
+                questions=args.questions,
+                options=args.options,
+                option_words=args.option_words,
+                question_words=args.question_words,
+                statuses=args.statuses,
+                days=args.days,
+                shared=args.shared,
+                batch_size=args.batch_size,
+                now=args.now
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Generated {counts[0]} quizzes with {counts[1]} questions ({counts[2]} new in the bank) "
+              f"in {time.perf_counter() - started:.1f}s.")
+    elif args.command == "purge":
+        options = {} if args.retention_days is None else {"retention_days": args.retention_days}
+        print(f"Purged {len(run_purge(**options))} deleted quizzes.")
+    elif args.command == "vacuum":
+        vacuum_database()
+        print("Database vacuumed.")
+    elif args.command == "snapshot":
+        snapshot = create_snapshot()
+        prune_snapshots()
+        print(f"Snapshot {snapshot['name']} ({snapshot['size_bytes']} bytes) created.")
+    elif args.command == "snapshots":
+        for snapshot in list_snapshots():
+            print(f"{snapshot['name']}  {snapshot['size_bytes']:>12}  {snapshot['created_at']:%Y-%m-%d %H:%M:%S}")
+    elif args.command == "restore":
+        restore_snapshot(args.name)
+        print(f"Database restored from {args.name}.")
+    elif args.command == "reindex":
+        rebuild_search_index(SessionLocal())
+        print("Search index rebuilt.")
+    else:
+        # If run directly, initialize and seed the database
+        db = init_db()
+        seed_sample_data(db)
+        print("Database initialized and seeded with sample data.")
\ No newline at end of file
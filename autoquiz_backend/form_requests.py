@@ -0,0 +1,100 @@
+# form_requests.py - Building and sending Google Forms batchUpdate requests
+import os
+import json
+from rate_limits import execute_google_request
+
+# Limits for a single batchUpdate call, read from the environment
+FORM_BATCH_MAX_REQUESTS = int(os.environ.get("FORM_BATCH_MAX_REQUESTS", 200))
+FORM_BATCH_MAX_BYTES = int(os.environ.get("FORM_BATCH_MAX_BYTES", 512 * 1024))
+
+def quiz_settings_request(is_quiz=True):
+    """Request turning a form into a quiz (or back)"""
+    return {
+        'updateSettings': {
+            'settings': {
+                'quizSettings': {
+                    'isQuiz': is_quiz
+                }
+            },
+            'updateMask': 'quizSettings.isQuiz'
+        }
+    }
+
+def create_question_item_request(question, index):
+    """Request adding a graded multiple-choice question at `index`"""
+    return {
+        'createItem': {
+            'item': {
+                'title': question.text,
+                'questionItem': {
+                    'question': {
+                        'questionId': f'{index}',
+                        'required': True,
+                        'grading': {
+                            'pointValue': 1,
+                            'correctAnswers': {
+                                'answers': [{
+                                    'value': question.options[question.correct_answer_index]
+                                }]
+                            },
+                            'whenRight': {
+                                'text': 'Correct'
+                            },
+                            'whenWrong': {
+                                'text': 'Incorrect'
+                            }
+                        },
+                        'choiceQuestion': {
+                            'type': 'RADIO',
+                            'options': [{'value': option} for option in question.options],
+                            'shuffle': True
+                        },
+                    },
+                }
+            },
+            'location': {
+                'index': index
+            }
+        }
+    }
+
+def quiz_form_requests(questions):
+    """Every request that turns a new, empty form into the quiz: settings first, then the questions"""
+    return [quiz_settings_request()] + [
+        create_question_item_request(question, index) for index, question in enumerate(questions)
+    ]
+
+def chunk_requests(requests, max_requests=FORM_BATCH_MAX_REQUESTS, max_bytes=FORM_BATCH_MAX_BYTES):
+    """
+    Split requests into as few in-order batches as the limits allow
+
+    A batch holds at most `max_requests` requests and roughly `max_bytes` of
+    JSON. A single request bigger than `max_bytes` still gets a batch of its own.
+    """
+    chunks = []
+    chunk, chunk_bytes = [], 0
+    for request in requests:
+        request_bytes = len(json.dumps(request, separators=(",", ":")))
+        if chunk and (len(chunk) >= max_requests or chunk_bytes + request_bytes > max_bytes):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(request)
+        chunk_bytes += request_bytes
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def execute_batch_update(forms_service, form_id, requests, **chunk_limits):
+    """
+    Apply requests to a form with as few batchUpdate calls as possible
+
+    Chunks are sent in order and each batchUpdate is applied atomically by
+    the API. A chunk turned away by a rate limit is retried on its own (see
+    execute_google_request). Other failures stop here, and the chunks that
+    already went through stay on the form. Returns the number of
+    batchUpdate calls made.
+    """
+    chunks = chunk_requests(requests, **chunk_limits)
+    for chunk in chunks:
+        execute_google_request("forms", forms_service.forms().batchUpdate(formId=form_id, body={'requests': chunk}))
+    return len(chunks)
@@ -0,0 +1,178 @@
+# google_clients.py - Lazily built, cached Google API clients
+import os
+import json
+import asyncio
+import threading
+import functools
+import httplib2
+from concurrent.futures import ThreadPoolExecutor
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+FORMS_SCOPES = ['https://www.googleapis.com/auth/forms.body', 'https://www.googleapis.com/auth/forms.body.readonly']
+GMAIL_SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+GMAIL_TOKEN_FILE = os.environ.get("GMAIL_TOKEN_FILE", "token.json")
+GMAIL_CLIENT_SECRETS_FILE = os.environ.get("GMAIL_CLIENT_SECRETS_FILE", "credentials.json")
+GOOGLE_HTTP_TIMEOUT = float(os.environ.get("GOOGLE_HTTP_TIMEOUT", 60))
+# Threads that make Google API calls; each keeps its own clients and their open connections
+GOOGLE_API_THREADS = int(os.environ.get("GOOGLE_API_THREADS", 8))
+
+def load_forms_credentials():
+    """Service account credentials for the Forms API, or None if they aren't configured"""
+    creds_file = os.environ.get('GOOGLE_CREDENTIALS_FILE', 'credentials2.json')
+    if not os.path.exists(creds_file):
+        print(f"Warning: Google credentials file {creds_file} not found.")
+        return None
+    return service_account.Credentials.from_service_account_file(creds_file, scopes=FORMS_SCOPES)
+
+def load_gmail_credentials(interactive=True):
+    """
+    OAuth credentials for sending mail, refreshed and saved back to the token file
+
+    Without a usable token the browser consent flow runs, unless
+    `interactive` is off, in which case None is returned.
+    """
+    creds = None
+    if os.path.exists(GMAIL_TOKEN_FILE):
+        creds = Credentials.from_authorized_user_file(GMAIL_TOKEN_FILE, GMAIL_SCOPES)
+
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+        elif interactive:
+            flow = InstalledAppFlow.from_client_secrets_file(GMAIL_CLIENT_SECRETS_FILE, GMAIL_SCOPES)
+            creds = flow.run_local_server(port=0)
+        else:
+            return None
+
+        with open(GMAIL_TOKEN_FILE, "w") as token:
+            token.write(creds.to_json())
+    return creds
+
+# name -> (API name, version, credentials loader)
+GOOGLE_SERVICES = {
+    "forms": ("forms", "v1", load_forms_credentials),
+    "gmail": ("gmail", "v1", load_gmail_credentials),
+}
+
+# Discovery documents and credentials are shared by the whole process, the
+# clients themselves are per thread because their HTTP transport isn't thread-safe
+discovery_documents = {}
+service_credentials = {}
+registry_lock = threading.Lock()
+thread_clients = threading.local()
+# Bumped by reset_google_clients so every thread rebuilds its clients
+registry_generation = 0
+
+def get_discovery_document(name):
+    """The discovery document bundled with google-api-python-client, parsed once per process"""
+    with registry_lock:
+        if name not in discovery_documents:
+            api, version, _ = GOOGLE_SERVICES[name]
+            discovery_documents[name] = json.loads(get_static_doc(api, version))
+        return discovery_documents[name]
+
+def make_refresh_thread_safe(credentials):
+    """
+    Serialize token refreshes of credentials shared between threads
+
+    A thread that was waiting on the lock skips its refresh when another
+    thread already replaced the token it saw, so a burst of expired requests
+    refreshes once instead of once per thread.
+    """
+    refresh = credentials.refresh
+    refresh_lock = threading.Lock()
+
+    def locked_refresh(request):
+        seen_token = credentials.token
+        with refresh_lock:
+            if credentials.token == seen_token or not credentials.valid:
+                refresh(request)
+
+    credentials.refresh = locked_refresh
+    return credentials
+
+def get_credentials(name):
+    """Credentials for a service, loaded once per process and safe to share between threads; None if unavailable"""
+    with registry_lock:
+        if name not in service_credentials:
+            credentials = GOOGLE_SERVICES[name][2]()
+            service_credentials[name] = credentials and make_refresh_thread_safe(credentials)
+        return service_credentials[name]
+
+def get_service(name):
+    """
+    The calling thread's client for a Google API, built on first use
+
+    Clients are built from the bundled static discovery document, so nothing
+    is fetched over the network. Each thread's client has its own keep-alive
+    HTTP connection, authorized with the shared credentials. Returns None when
+    the service has no credentials.
+    """
+    if getattr(thread_clients, "generation", None) != registry_generation:
+        thread_clients.clients = {}
+        thread_clients.generation = registry_generation
+    clients = thread_clients.clients
+    if name not in clients:
+        credentials = get_credentials(name)
+        if credentials is None:
+            return None
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+        clients[name] = build_from_document(get_discovery_document(name), http=http)
+    return clients[name]
+
+def get_forms_service():
+    """The calling thread's Forms API client, or None if Forms isn't configured"""
+    try:
+        return get_service("forms")
+    except Exception as e:
+        print(f"Error setting up Google Forms API: {e}")
+        return None
+
+def get_gmail_service():
+    """The calling thread's Gmail API client"""
+    return get_service("gmail")
+
+def reset_google_clients():
+    """Forget cached credentials and clients in every thread, e.g. after rotating credential files"""
+    global registry_generation
+    with registry_lock:
+        service_credentials.clear()
+        registry_generation += 1
+
+# Google API calls run on this fixed set of threads rather than the shared
+# threadpool, so a handful of long-lived clients keep their TLS connections open
+google_executor = ThreadPoolExecutor(max_workers=GOOGLE_API_THREADS, thread_name_prefix="google-api")
+
+async def run_google_call(func, *args, **kwargs):
+    """Run a blocking Google API call on the Google API threads"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(google_executor, functools.partial(func, *args, **kwargs))
+
+def warm_up_google_clients(names=tuple(GOOGLE_SERVICES)):
+    """
+    Load discovery documents and credentials ahead of the first request
+
+    Gmail is only warmed up when a saved token exists, so startup never
+    waits on the interactive consent flow. Failures are logged and left for
+    the first real call to report.
+    """
+    for name in names:
+        try:
+            get_discovery_document(name)
+            if name == "gmail":
+                with registry_lock:
+                    if name not in service_credentials:
+                        credentials = load_gmail_credentials(interactive=False)
+                        if credentials is not None:
+                            service_credentials[name] = make_refresh_thread_safe(credentials)
+                if name not in service_credentials:
+                    continue
+            get_service(name)
+        except Exception as e:
+            print(f"Error warming up Google {name} client: {e}")
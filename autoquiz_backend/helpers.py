@@ -1,52 +1,39 @@
 # Google Forms API setup
 import os
+import re
 import json
 import json_repair
 import smtplib
+import hashlib
+import threading
+from cachetools import LRUCache
 from fastapi import HTTPException, Depends
+from pydantic import ValidationError
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from googleapiclient.discovery import build 
-from google.oauth2 import service_account
+from sqlalchemy import DateTime, func, insert, literal, literal_column, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from models import QuizDB, QuestionDB, get_db, QuizStatus, Question
+from models import QuizDB, FormStatus, QuestionBankDB, QuizQuestionDB, QuizStatusCountDB, get_db, get_async_db, get_async_read_db, get_read_sessionmaker, AsyncSessionLocal, QuizStatus, Question, QuizResponse, quiz_search_table, question_content_hash
 from typing import List
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 import os
 import base64
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
 from google import genai
 import os
 import json
 from fastapi import HTTPException
 from models import QuizCreate, Question
-
-# If modifying these SCOPES, delete the token.json file and re-authenticate
-
-def get_gmail_service():
-    SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
-    """Authenticate and return a Gmail API service instance."""
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-
-    return build("gmail", "v1", credentials=creds)
+from form_requests import execute_batch_update, quiz_form_requests
+from google_clients import get_forms_service, get_gmail_service
+from rate_limits import execute_google_request
 
 def send_email_notification(recipients, quiz_title, form_url):
     """Send email notification with quiz link using Gmail API."""
@@ -77,7 +64,7 @@ def send_email_notification(recipients, quiz_title, form_url):
         message = {"raw": raw_message}
 
         # Send email using Gmail API
-        service.users().messages().send(userId="me", body=message).execute()
+        execute_google_request("gmail", service.users().messages().send(userId="me", body=message))
 
         print("Email sent successfully!")
         return True
@@ -87,183 +74,694 @@ def send_email_notification(recipients, quiz_title, form_url):
         return False
 
 
-def setup_google_forms_api():
-    try:
-        SCOPES = ['https://www.googleapis.com/auth/forms.body','https://www.googleapis.com/auth/forms.body.readonly']
-        creds_file = os.environ.get('GOOGLE_CREDENTIALS_FILE', 'credentials2.json')
-        
-        # Check if credentials file exists
-        if not os.path.exists(creds_file):
-            print(f"Warning: Google credentials file {creds_file} not found.")
-            return None
-            
-        credentials = service_account.Credentials.from_service_account_file(
-            creds_file, scopes=SCOPES)
-        forms_service = build('forms', 'v1', credentials=credentials)
-        return forms_service
-    except Exception as e:
-        print(f"Error setting up Google Forms API: {e}")
-        return None
-
-# Initialize Google Forms service
-forms_service = setup_google_forms_api()
+def google_form_url(form_id):
+    """Edit URL of a Google Form"""
+    return f"https://docs.google.com/forms/d/{form_id}/edit"
 
-
-def create_google_form(title, description, questions):
-    """Create a Google Form using the Google Forms API"""
+def start_google_form(title):
+    """Create an empty Google Form and return its ID"""
+    forms_service = get_forms_service()
     if not forms_service:
         raise HTTPException(status_code=500, detail="Google Forms API not available")
     
     try:
-        # Create a new form
         form_body = {
             'info': {
                 'title': title,
             }
         }
-        
-        created_form = forms_service.forms().create(body=form_body).execute()
-        form_id = created_form['formId']
-        form_url = f"https://docs.google.com/forms/d/{form_id}/edit"
-        
-        # Add questions to the form
-        question_requests = []
-        for idx, question in enumerate(questions):
-            item_request = {
-                'createItem': {
-                    'item': {
-                        'title': question.text,
-                        'questionItem': {
-                            'question': {
-                                'questionId' : f'{idx}',
-                                'required': True,
-                            "grading": {
-                                "pointValue": 1,
-                                "correctAnswers": {
-                                    "answers":[{
-                                        "value": question.options[question.correct_answer_index]
-                                    }]
-                                },
-                                "whenRight": {
-                                    "text": "Correct"
-                                },
-                                "whenWrong": {
-                                    "text": "Incorrect"
-                                }
-                            },
-                                'choiceQuestion': {
-                                    'type': 'RADIO',
-                                    'options': [{'value': option} for option in question.options],
-                                    'shuffle': True
-                                },
-
-                            },
-                        }
-                    },
-                    'location': {
-                        'index': idx
-                    }
-                }
-            }
-            question_requests.append(item_request)
-        
-        # Execute batch update to add questions
-        
-        # Set the form to be a quiz
-        quiz_settings_request = {
-            'updateSettings': {
-                'settings': {
-                    'quizSettings': {
-                        'isQuiz': True
-                    }
-                },
-                'updateMask': 'quizSettings.isQuiz'
-            }
-        }
-        
-        forms_service.forms().batchUpdate(
-            formId=form_id,
-            body={'requests': [quiz_settings_request]}
-        ).execute()
-        
-        if question_requests:
-            forms_service.forms().batchUpdate(
-                formId=form_id,
-                body={'requests': question_requests}
-            ).execute()
-        return form_id, form_url
+        created_form = execute_google_request("forms", forms_service.forms().create(body=form_body))
+        return created_form['formId']
     except Exception as e:
         print(f"Error creating Google Form: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create Google Form: {str(e)}")
 
+def fill_google_form(form_id, questions, resume=False):
+    """
+    Turn a form made by start_google_form into the quiz and return its URL
+
+    With `resume`, the form may already hold the questions an earlier
+    attempt added. Each batchUpdate is applied whole and in order, so those
+    are always the first ones and only the rest are sent.
+    """
+    forms_service = get_forms_service()
+    if not forms_service:
+        raise HTTPException(status_code=500, detail="Google Forms API not available")
+    
+    try:
+        requests = quiz_form_requests(questions)
+        if resume:
+            form = execute_google_request("forms", forms_service.forms().get(formId=form_id), idempotent=True)
+            # Keep the settings request, skip the questions that are already there
+            requests = requests[:1] + requests[1 + len(form.get('items', [])):]
+        # Quiz settings and questions go out together, in as few batches as the size limits allow
+        execute_batch_update(forms_service, form_id, requests)
+        return google_form_url(form_id)
+    except Exception as e:
+        print(f"Error filling in Google Form {form_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to create Google Form: {str(e)}")
+
 
 # Database operations
-def get_quiz_by_id(db: Session, quiz_id: str):
+async def get_quiz_by_id(db: AsyncSession, quiz_id: str):
     """Get a quiz by ID"""
-    return db.query(QuizDB).filter(QuizDB.id == quiz_id).first()
+    result = await db.execute(select(QuizDB).where(QuizDB.id == quiz_id))
+    return result.scalars().first()
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(db_quiz):
+    """Build an opaque pagination cursor pointing just past the given quiz"""
+    payload = json.dumps([db_quiz.created_at.isoformat(), db_quiz.id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    """Decode a pagination cursor into its (created_at, id) position"""
+    try:
+        created_at, quiz_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(quiz_id)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+
+async def get_all_quizzes(db: AsyncSession, status=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Get one page of quizzes, newest first, optionally filtered by status
+
+    Pages are keyset-paginated on (created_at, id) so every page is an index
+    range scan, however deep it is. Returns the quizzes and the cursor of the
+    next page (None on the last page).
+    """
+    query = select(QuizDB).where(QuizDB.status != QuizStatus.DELETED)
+    if status:
+        query = query.where(QuizDB.status == status)
+    if cursor:
+        created_at, quiz_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(QuizDB.created_at, QuizDB.id) < tuple_(literal(created_at, DateTime), literal(quiz_id))
+        )
+
+    # Fetch one extra row to find out whether another page follows
+    query = query.order_by(QuizDB.created_at.desc(), QuizDB.id.desc()).limit(limit + 1)
+    quizzes = (await db.execute(query)).scalars().all()
+    next_cursor = None
+    if len(quizzes) > limit:
+        quizzes = quizzes[:limit]
+        next_cursor = encode_cursor(quizzes[-1])
+    return quizzes, next_cursor
+
+async def get_quiz_status_counts(db: AsyncSession):
+    """Get the number of quizzes in every status from the trigger-maintained counters"""
+    rows = await db.execute(select(QuizStatusCountDB.status, QuizStatusCountDB.count))
+    counts = {status: 0 for status in QuizStatus}
+    counts.update(rows.all())
+    return counts
+
+def total_for_status(counts, status=None):
+    """Number of listable quizzes in a status, or in all non-deleted statuses"""
+    if status == QuizStatus.DELETED:
+        return 0
+    if status:
+        return counts[status]
+    return sum(count for quiz_status, count in counts.items() if quiz_status != QuizStatus.DELETED)
+
+async def get_quiz_list_version(db: AsyncSession, status=None):
+    """
+    Count non-deleted quizzes and find when any quiz last changed
+
+    Together these identify the state of a quiz listing cheaply, for
+    validating ETags and for the list's total: the count comes from the
+    status counters and the latest update from the end of the updated_at
+    index, so neither depends on the number of quizzes.
+    """
+    counts = await get_quiz_status_counts(db)
+    last_updated = (await db.execute(select(func.max(QuizDB.updated_at)))).scalar()
+    return total_for_status(counts, status), last_updated
+
+def make_etag(*parts):
+    """Build a strong ETag from the values a representation depends on"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+def format_http_date(value: datetime):
+    """Format a naive local datetime as an HTTP date"""
+    return format_datetime(value.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+def is_not_modified(etag, last_modified=None, if_none_match=None, if_modified_since=None):
+    """
+    Check a request's validators against the current ETag and modification time
 
-def get_all_quizzes(db: Session, status=None):
-    """Get all quizzes, optionally filtered by status"""
-    query = db.query(QuizDB).filter(QuizDB.status != QuizStatus.DELETED)
+    If-Modified-Since is only consulted when the client sent no If-None-Match.
+    """
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        client_tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in client_tags
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+    return False
+
+def build_search_query(q: str):
+    """Turn free text into an FTS5 query that matches every word as a prefix"""
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    return " ".join(f'"{term}"*' for term in terms)
+
+def encode_offset_cursor(offset: int):
+    """Build an opaque cursor for offset-paginated results such as search hits"""
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode("utf-8")).decode("ascii")
+
+def decode_offset_cursor(cursor: str):
+    """Decode a cursor built by encode_offset_cursor"""
+    try:
+        offset = int(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["offset"])
+    except (ValueError, TypeError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {str(e)}")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor: negative offset")
+    return offset
+
+async def search_quizzes_in_db(db: AsyncSession, q: str, status=None, limit=DEFAULT_PAGE_SIZE, offset=0):
+    """
+    Full-text search over quiz titles, descriptions and question text
+
+    On SQLite this runs against the quiz_search FTS5 index and ranks hits by
+    bm25, weighting title matches above description and question matches.
+    Other databases fall back to a substring match on title and description.
+    Returns one page of quizzes and the total number of hits.
+    """
+    fts_query = build_search_query(q)
+    query = select(QuizDB).where(QuizDB.status != QuizStatus.DELETED)
     if status:
-        query = query.filter(QuizDB.status == status)
-    return query.all()
+        query = query.where(QuizDB.status == status)
+    
+    if db.bind.dialect.name == "sqlite":
+        query = query.join(quiz_search_table, quiz_search_table.c.quiz_id == QuizDB.id).where(
+            literal_column("quiz_search").op("MATCH")(fts_query)
+        )
+        rank = func.bm25(literal_column("quiz_search"), 0.0, 10.0, 5.0, 1.0)
+    else:
+        pattern = f"%{q}%"
+        query = query.where(or_(QuizDB.title.ilike(pattern), QuizDB.description.ilike(pattern)))
+        rank = QuizDB.created_at.desc()
+    
+    total = (await db.execute(select(func.count()).select_from(query.subquery()))).scalar()
+    page = query.order_by(rank, QuizDB.id).limit(limit).offset(offset)
+    quizzes = (await db.execute(page)).scalars().all()
+    return quizzes, total
+
+# Keeps IN lists and multi-row INSERTs under SQLite's bound-parameter limit
+BANK_CHUNK_SIZE = 5000
+
+async def get_bank_question_ids(db: AsyncSession, content_hashes):
+    """Look up question bank IDs by content hash through the unique hash index"""
+    question_ids = {}
+    content_hashes = list(content_hashes)
+    for start in range(0, len(content_hashes), BANK_CHUNK_SIZE):
+        chunk = content_hashes[start:start + BANK_CHUNK_SIZE]
+        rows = await db.execute(
+            select(QuestionBankDB.content_hash, QuestionBankDB.id).where(QuestionBankDB.content_hash.in_(chunk))
+        )
+        question_ids.update(rows.all())
+    return question_ids
 
-def create_quiz_in_db(db: Session, quiz_data, form_id=None, form_url=None):
-    """Create a new quiz in the database"""
-    quiz_id = str(uuid.uuid4())
+async def store_questions_in_bank(db: AsyncSession, bank_rows):
+    """
+    Add questions to the bank unless an identical question is already there
+
+    Returns the bank ID of every given question, keyed by content hash.
+    """
+    if db.bind.dialect.name == "postgresql":
+        statement = postgresql_insert(QuestionBankDB.__table__)
+    else:
+        statement = sqlite_insert(QuestionBankDB.__table__)
+    statement = statement.on_conflict_do_nothing(index_elements=["content_hash"])
+    for start in range(0, len(bank_rows), BANK_CHUNK_SIZE):
+        await db.execute(statement, bank_rows[start:start + BANK_CHUNK_SIZE])
+    return await get_bank_question_ids(db, [row["content_hash"] for row in bank_rows])
+
+async def create_quizzes_in_db(db: AsyncSession, quizzes, forms=None, form_status=None):
+    """
+    Create many quizzes and all their questions in a single transaction
+
+    The quiz rows, the new question bank entries and the quiz-question
+    links are each written with one bulk INSERT, and the response dicts are
+    built from the in-memory data instead of being queried back. `forms`
+    optionally holds one (form_id, form_url) pair per quiz; `form_status`
+    is stored on every quiz, e.g. PENDING when forms will be created later.
+    """
     current_time = datetime.now()
+    quiz_rows = []
+    bank_rows = {}
+    link_rows = []
+    search_rows = []
+    responses = []
     
-    db_quiz = QuizDB(
-        id=quiz_id,
-        title=quiz_data.title,
-        description=quiz_data.description,
-        status=QuizStatus.DRAFT,
-        form_id=form_id,
-        form_url=form_url,
-        created_at=current_time,
-        updated_at=current_time
-    )
+    for idx, quiz_data in enumerate(quizzes):
+        form_id, form_url = forms[idx] if forms else (None, None)
+        quiz_row = {
+            "id": str(uuid.uuid4()),
+            "title": quiz_data.title,
+            "description": quiz_data.description,
+            "status": QuizStatus.DRAFT,
+            "form_id": form_id,
+            "form_url": form_url,
+            "form_status": FormStatus.READY if form_url else form_status,
+            "created_at": current_time,
+            "updated_at": current_time
+        }
+        quiz_rows.append(quiz_row)
+        
+        questions = []
+        for position, question in enumerate(quiz_data.questions):
+            options = json.dumps(question.options)
+            content_hash = question_content_hash(question.text, options, question.correct_answer_index)
+            bank_rows[content_hash] = {
+                "content_hash": content_hash,
+                "text": question.text,
+                "options": options,
+                "correct_answer_index": question.correct_answer_index
+            }
+            link_rows.append({"quiz_id": quiz_row["id"], "position": position, "content_hash": content_hash})
+            questions.append({
+                "text": question.text,
+                "options": list(question.options),
+                "correct_answer_index": question.correct_answer_index
+            })
+        responses.append({**quiz_row, "questions": questions, "question_count": len(questions)})
+        search_rows.append({
+            "quiz_id": quiz_row["id"],
+            "title": quiz_data.title,
+            "description": quiz_data.description or "",
+            "questions": "\n".join(question.text for question in quiz_data.questions)
+        })
     
-    db.add(db_quiz)
-    db.commit()
+    if quiz_rows:
+        await db.execute(insert(QuizDB), quiz_rows)
+    if link_rows:
+        question_ids = await store_questions_in_bank(db, list(bank_rows.values()))
+        await db.execute(insert(QuizQuestionDB), [
+            {"quiz_id": link["quiz_id"], "position": link["position"], "question_id": question_ids[link["content_hash"]]}
+            for link in link_rows
+        ])
+    if search_rows and db.bind.dialect.name == "sqlite":
+        await db.execute(insert(quiz_search_table), search_rows)
+    await db.commit()
+    return responses
+
+IMPORT_BATCH_SIZE = 500
+MAX_IMPORT_BATCH_SIZE = 5000
+
+async def read_import_records(body_stream, json_array=False):
+    """
+    Parse an import body into (record number, QuizCreate or error message) pairs
+
+    NDJSON bodies are validated line by line as they stream in; a JSON array
+    body has to be read whole first. Blank lines are skipped but still count
+    towards the record numbers.
+    """
+    if json_array:
+        body = b"".join([chunk async for chunk in body_stream])
+        try:
+            items = json.loads(body)
+        except json.JSONDecodeError as e:
+            yield 1, f"Invalid JSON: {str(e)}"
+            return
+        if not isinstance(items, list):
+            yield 1, "Expected a JSON array of quizzes"
+            return
+        for number, item in enumerate(items, start=1):
+            try:
+                yield number, QuizCreate.model_validate(item)
+            except ValidationError as e:
+                yield number, str(e)
+        return
     
-    # Add questions
-    for question in quiz_data.questions:
-        db_question = QuestionDB(
-            quiz_id=quiz_id,
-            text=question.text,
-            options=json.dumps(question.options),
-            correct_answer_index=question.correct_answer_index
-        )
-        db.add(db_question)
+    number = 0
+    buffer = b""
+    async for chunk in body_stream:
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        for line in lines:
+            number += 1
+            if line.strip():
+                yield number, parse_import_line(line)
+    if buffer.strip():
+        yield number + 1, parse_import_line(buffer)
+
+def parse_import_line(line: bytes):
+    """Validate one NDJSON import line, returning a QuizCreate or an error message"""
+    try:
+        return QuizCreate.model_validate_json(line)
+    except ValidationError as e:
+        return str(e)
+
+async def import_quizzes_in_db(db: AsyncSession, records, batch_size=IMPORT_BATCH_SIZE, create_forms=False):
+    """
+    Insert validated import records in transactions of `batch_size` quizzes
+
+    Invalid records, and every record of a batch whose transaction fails, are
+    reported as errors without stopping the rest of the import. With
+    `create_forms` the quizzes are stored with a pending form for the form
+    workers to pick up. Returns the number of imported quizzes and the list
+    of errors.
+    """
+    imported = 0
+    errors = []
+    batch = []
+    form_status = FormStatus.PENDING if create_forms else None
     
-    db.commit()
-    db.refresh(db_quiz)
+    async def flush():
+        nonlocal imported
+        try:
+            await create_quizzes_in_db(db, [quiz_data for _, quiz_data in batch], form_status=form_status)
+            imported += len(batch)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            errors.extend({"record": number, "detail": f"Database error: {str(e)}"} for number, _ in batch)
+        batch.clear()
+    
+    async for number, record in records:
+        if isinstance(record, str):
+            errors.append({"record": number, "detail": record})
+            continue
+        batch.append((number, record))
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return imported, errors
+
+async def create_quiz_in_db(db: AsyncSession, quiz_data, form_id=None, form_url=None, form_status=None):
+    """Create a new quiz in the database and return its response data"""
+    response_data = (await create_quizzes_in_db(db, [quiz_data], [(form_id, form_url)], form_status))[0]
+    cache_quiz_response(response_data)
+    return response_data
+
+async def transition_quiz_status(db: AsyncSession, quiz_id: str, new_status: QuizStatus, from_statuses, *conditions):
+    """
+    Move a quiz to a new status only if its current status is in from_statuses
+
+    The check and the change are a single UPDATE ... RETURNING statement, so
+    concurrent transitions of the same quiz can't both succeed. Extra
+    SQLAlchemy conditions on QuizDB may further restrict the update. Returns
+    the updated quiz, or None if no quiz matched.
+    """
+    result = await db.execute(
+        update(QuizDB)
+        .where(QuizDB.id == quiz_id, QuizDB.status.in_(from_statuses), *conditions)
+        .values(status=new_status, updated_at=datetime.now())
+        .returning(QuizDB)
+        .execution_options(synchronize_session=False)
+    )
+    db_quiz = result.scalars().first()
+    await db.commit()
+    if db_quiz:
+        invalidate_quiz_responses([quiz_id])
     return db_quiz
 
-def update_quiz_status(db: Session, quiz_id: str, new_status: QuizStatus):
-    """Update the status of a quiz"""
-    db_quiz = get_quiz_by_id(db, quiz_id)
-    if not db_quiz:
-        return None
-    
-    db_quiz.status = new_status
-    db_quiz.updated_at = datetime.now()
-    db.commit()
-    db.refresh(db_quiz)
+async def request_quiz_form(db: AsyncSession, quiz_id: str):
+    """
+    Mark a quiz's Google Form as pending again so the form workers retry it
+
+    Only quizzes that aren't deleted and whose form failed or was never
+    requested qualify. Returns the updated quiz, or None if nothing matched.
+    """
+    result = await db.execute(
+        update(QuizDB)
+        .where(
+            QuizDB.id == quiz_id,
+            QuizDB.status != QuizStatus.DELETED,
+            or_(QuizDB.form_status == FormStatus.FAILED, QuizDB.form_status.is_(None)),
+            QuizDB.form_url.is_(None)
+        )
+        .values(form_status=FormStatus.PENDING, updated_at=datetime.now())
+        .returning(QuizDB)
+        .execution_options(synchronize_session=False)
+    )
+    db_quiz = result.scalars().first()
+    await db.commit()
+    if db_quiz:
+        invalidate_quiz_responses([quiz_id])
     return db_quiz
 
-def convert_db_quiz_to_response(db_quiz):
-    """Convert a DB quiz model to a response model"""
-    # Get questions
-    questions = []
-    for q in db_quiz.questions:
-        questions.append({
-            "text": q.text,
-            "options": json.loads(q.options),
-            "correct_answer_index": q.correct_answer_index
+async def update_quiz_status(db: AsyncSession, quiz_id: str, new_status: QuizStatus):
+    """Update the status of a quiz, whatever its current status"""
+    return await transition_quiz_status(db, quiz_id, new_status, list(QuizStatus))
+
+MAX_BATCH_IDS = 500
+
+async def get_quizzes_by_ids(db: AsyncSession, quiz_ids):
+    """Get many quizzes with a single IN query, as a dict keyed by quiz ID"""
+    if not quiz_ids:
+        return {}
+    result = await db.execute(select(QuizDB).where(QuizDB.id.in_(list(quiz_ids))))
+    return {db_quiz.id: db_quiz for db_quiz in result.scalars()}
+
+# For each status, the statuses a quiz may be moved into it from
+ALLOWED_STATUS_TRANSITIONS = {
+    QuizStatus.DRAFT: {QuizStatus.DELETED},
+    QuizStatus.APPROVED: {QuizStatus.DRAFT},
+    QuizStatus.DELETED: {QuizStatus.DRAFT, QuizStatus.APPROVED},
+}
+
+async def bulk_update_quiz_status(db: AsyncSession, quiz_ids, new_status: QuizStatus):
+    """
+    Move many quizzes to a new status with one set-based UPDATE
+
+    Only quizzes whose current status allows the transition are changed, all
+    in one transaction. Returns the outcome for every requested ID: "updated",
+    "unchanged" (already in that status), "invalid_transition" or "not_found".
+    """
+    quiz_ids = list(dict.fromkeys(quiz_ids))
+    from_statuses = ALLOWED_STATUS_TRANSITIONS[new_status]
+    result = await db.execute(
+        update(QuizDB)
+        .where(QuizDB.id.in_(quiz_ids), QuizDB.status.in_(from_statuses))
+        .values(status=new_status, updated_at=datetime.now())
+        .returning(QuizDB.id)
+        .execution_options(synchronize_session=False)
+    )
+    updated = set(result.scalars())
+    
+    # Only the IDs that weren't updated need a second look to explain why
+    current = {}
+    skipped = [quiz_id for quiz_id in quiz_ids if quiz_id not in updated]
+    if skipped:
+        rows = await db.execute(select(QuizDB.id, QuizDB.status).where(QuizDB.id.in_(skipped)))
+        current = dict(rows.all())
+    await db.commit()
+    invalidate_quiz_responses(updated)
+    
+    outcomes = {}
+    for quiz_id in quiz_ids:
+        if quiz_id in updated:
+            outcomes[quiz_id] = "updated"
+        elif quiz_id not in current:
+            outcomes[quiz_id] = "not_found"
+        elif current[quiz_id] == new_status:
+            outcomes[quiz_id] = "unchanged"
+        else:
+            outcomes[quiz_id] = "invalid_transition"
+    return outcomes
+
+async def get_quiz_version(db: AsyncSession, quiz_id: str):
+    """Get just the status and updated_at of a quiz, or None if it doesn't exist"""
+    result = await db.execute(select(QuizDB.status, QuizDB.updated_at).where(QuizDB.id == quiz_id))
+    return result.first()
+
+# Serialized quiz responses
+QUIZ_CACHE_MAX_BYTES = int(os.environ.get("QUIZ_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# quiz_id -> (updated_at, JSON bytes), bounded by the total size of the JSON
+quiz_response_cache = LRUCache(maxsize=QUIZ_CACHE_MAX_BYTES, getsizeof=lambda entry: len(entry[1]))
+quiz_response_cache_lock = threading.Lock()
+
+def cache_quiz_response(response_data):
+    """Serialize a quiz response dict to JSON bytes and keep it in the response cache"""
+    blob = QuizResponse(**response_data).model_dump_json().encode("utf-8")
+    if len(blob) <= QUIZ_CACHE_MAX_BYTES:
+        with quiz_response_cache_lock:
+            quiz_response_cache[response_data["id"]] = (response_data["updated_at"], blob)
+    return blob
+
+def get_cached_quiz_response(quiz_id: str, updated_at):
+    """
+    Get the cached JSON of a quiz, or None on a miss
+
+    Entries are only served while their updated_at matches the database, so
+    a change made by another worker process is never served stale.
+    """
+    with quiz_response_cache_lock:
+        entry = quiz_response_cache.get(quiz_id)
+    if entry and entry[0] == updated_at:
+        return entry[1]
+    return None
+
+def invalidate_quiz_responses(quiz_ids):
+    """Drop cached responses for quizzes that changed"""
+    with quiz_response_cache_lock:
+        for quiz_id in quiz_ids:
+            quiz_response_cache.pop(quiz_id, None)
+
+def clear_quiz_responses():
+    """Drop every cached response, e.g. after the whole database was replaced"""
+    with quiz_response_cache_lock:
+        quiz_response_cache.clear()
+
+async def load_questions_for_quizzes(db: AsyncSession, quiz_ids):
+    """
+    Load the questions of many quizzes with a couple of queries
+
+    The quiz-question links come first, then every distinct bank question
+    they point to, BANK_CHUNK_SIZE IDs at a time, so questions shared between
+    quizzes are read and decoded once. Returns a dict mapping every requested
+    quiz ID to its questions (in quiz order) as response-ready dicts.
+    """
+    grouped = {quiz_id: [] for quiz_id in quiz_ids}
+    if not grouped:
+        return grouped
+
+    links = (await db.execute(
+        select(QuizQuestionDB.quiz_id, QuizQuestionDB.question_id)
+        .where(QuizQuestionDB.quiz_id.in_(list(grouped)))
+        .order_by(QuizQuestionDB.quiz_id, QuizQuestionDB.position)
+    )).all()
+    question_ids = list({question_id for _, question_id in links})
+    bank = {}
+    for start in range(0, len(question_ids), BANK_CHUNK_SIZE):
+        rows = await db.execute(
+            select(QuestionBankDB.id, QuestionBankDB.text, QuestionBankDB.options, QuestionBankDB.correct_answer_index)
+            .where(QuestionBankDB.id.in_(question_ids[start:start + BANK_CHUNK_SIZE]))
+        )
+        bank.update(
+            (question_id, (text, json.loads(options), correct_answer_index))
+            for question_id, text, options, correct_answer_index in rows
+        )
+    for quiz_id, question_id in links:
+        text, options, correct_answer_index = bank[question_id]
+        grouped[quiz_id].append({
+            "text": text,
+            "options": list(options),
+            "correct_answer_index": correct_answer_index
         })
+    return grouped
+
+async def hydrate_quiz_responses(db: AsyncSession, db_quizzes):
+    """Convert a batch of DB quizzes to response dicts, loading all their questions in one query"""
+    questions = await load_questions_for_quizzes(db, [db_quiz.id for db_quiz in db_quizzes])
+    return [convert_db_quiz_to_response(db_quiz, questions[db_quiz.id]) for db_quiz in db_quizzes]
+
+async def count_questions_for_quizzes(db: AsyncSession, quiz_ids):
+    """Count the questions of many quizzes with one grouped query, as a dict keyed by quiz ID"""
+    counts = {quiz_id: 0 for quiz_id in quiz_ids}
+    if not counts:
+        return counts
+    rows = await db.execute(
+        select(QuizQuestionDB.quiz_id, func.count(QuizQuestionDB.position))
+        .where(QuizQuestionDB.quiz_id.in_(list(counts)))
+        .group_by(QuizQuestionDB.quiz_id)
+    )
+    counts.update(rows.all())
+    return counts
+
+QUIZ_RESPONSE_FIELDS = list(QuizResponse.model_fields)
+SUMMARY_FIELDS = [field for field in QUIZ_RESPONSE_FIELDS if field != "questions"]
+
+def resolve_quiz_fields(fields=None, view="full"):
+    """
+    Work out which response fields a request selected
+
+    `fields` is a comma-separated list of QuizResponse fields and wins over
+    `view`; the ID is always included. Returns None for the full
+    representation.
+    """
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in requested if field not in QUIZ_RESPONSE_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        return list(dict.fromkeys(["id", *requested]))
+    if view == "summary":
+        return SUMMARY_FIELDS
+    return None
+
+async def build_quiz_responses(db: AsyncSession, db_quizzes, fields=None):
+    """
+    Convert a batch of DB quizzes to response dicts holding only the selected fields
+
+    Questions are only loaded when they were selected; question_count alone
+    comes from a grouped count instead. With no field selection this is the
+    same as hydrate_quiz_responses.
+    """
+    if fields is None:
+        return await hydrate_quiz_responses(db, db_quizzes)
+    
+    quiz_ids = [db_quiz.id for db_quiz in db_quizzes]
+    if "questions" in fields:
+        questions = await load_questions_for_quizzes(db, quiz_ids)
+        counts = {quiz_id: len(quiz_questions) for quiz_id, quiz_questions in questions.items()}
+    else:
+        questions = {quiz_id: [] for quiz_id in quiz_ids}
+        counts = await count_questions_for_quizzes(db, quiz_ids) if "question_count" in fields else {}
+    
+    responses = []
+    for db_quiz in db_quizzes:
+        data = convert_db_quiz_to_response(db_quiz, questions[db_quiz.id])
+        data["question_count"] = counts.get(db_quiz.id)
+        responses.append({field: data[field] for field in fields})
+    return responses
+
+EXPORT_BATCH_SIZE = 500
+
+async def stream_quiz_export(status=None, updated_since=None, batch_size=EXPORT_BATCH_SIZE, session_factory=AsyncSessionLocal):
+    """
+    Yield every matching quiz, with its questions, as a line of NDJSON
+
+    Quizzes are streamed from the database `batch_size` at a time and each
+    batch's questions are loaded with one query, so memory use stays flat
+    however many quizzes there are. Deleted quizzes are included unless a
+    status is given, so incremental exports also pick up deletions. The
+    export runs in its own session because it outlives the request.
+    """
+    query = select(QuizDB).order_by(QuizDB.updated_at, QuizDB.id)
+    if status:
+        query = query.where(QuizDB.status == status)
+    if updated_since:
+        query = query.where(QuizDB.updated_at >= updated_since)
+    
+    async with session_factory() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for db_quizzes in result.scalars().partitions():
+            lines = [
+                QuizResponse(**data).model_dump_json().encode("utf-8") + b"\n"
+                for data in await hydrate_quiz_responses(db, db_quizzes)
+            ]
+            yield b"".join(lines)
+
+def convert_db_quiz_to_response(db_quiz, questions=None):
+    """
+    Convert a DB quiz model to a response model
+
+    Pass pre-loaded questions (see hydrate_quiz_responses) to avoid a lazy
+    per-quiz question query.
+    """
+    if questions is None:
+        questions = []
+        for link in db_quiz.questions:
+            questions.append({
+                "text": link.question.text,
+                "options": json.loads(link.question.options),
+                "correct_answer_index": link.question.correct_answer_index
+            })
     
     return {
         "id": db_quiz.id,
@@ -272,19 +770,22 @@ def convert_db_quiz_to_response(db_quiz):
         "status": db_quiz.status,
         "form_url": db_quiz.form_url,
         "form_id": db_quiz.form_id,
+        "form_status": db_quiz.form_status,
         "created_at": db_quiz.created_at,
         "updated_at": db_quiz.updated_at,
-        "questions": questions
+        "questions": questions,
+        "question_count": len(questions)
     }
 
 def get_google_form_details(form_id):
     """Retrieve questions, options, and answers from a Google Form by its ID"""
+    forms_service = get_forms_service()
     if not forms_service:
         raise HTTPException(status_code=500, detail="Google Forms API not available")
     
     try:
         # Get the form
-        form = forms_service.forms().get(formId=form_id).execute()
+        form = execute_google_request("forms", forms_service.forms().get(formId=form_id), idempotent=True)
         
         # Extract questions, options, and answers
         questions = []
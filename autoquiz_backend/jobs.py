@@ -0,0 +1,165 @@
+# jobs.py - Background Google Form provisioning
+import os
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, select, update
+from models import AsyncSessionLocal, FormStatus, QuizDB, QuizStatus, Question
+from helpers import start_google_form, fill_google_form, load_questions_for_quizzes, invalidate_quiz_responses
+from google_clients import run_google_call
+
+# Form worker settings, read from the environment
+FORM_WORKERS = int(os.environ.get("FORM_WORKERS", 4))
+FORM_MAX_ATTEMPTS = int(os.environ.get("FORM_MAX_ATTEMPTS", 3))
+FORM_RETRY_DELAY_SECONDS = float(os.environ.get("FORM_RETRY_DELAY_SECONDS", 2))
+# How long a worker's claim on a form job lasts before another worker may take it over
+FORM_LEASE_SECONDS = int(os.environ.get("FORM_LEASE_SECONDS", 600))
+
+# Created by start_form_workers on the running event loop
+form_queue = None
+# Quizzes waiting in the queue or being provisioned, so nothing is queued twice
+queued_quiz_ids = set()
+form_workers = []
+
+def enqueue_form(quiz_id: str):
+    """Queue a quiz for Google Form provisioning; without running workers it stays pending for the next start"""
+    if form_queue is not None and quiz_id not in queued_quiz_ids:
+        queued_quiz_ids.add(quiz_id)
+        form_queue.put_nowait(quiz_id)
+
+def claimable_form():
+    """Live quizzes whose form is waiting for a worker, or whose worker's lease ran out"""
+    return and_(
+        QuizDB.status != QuizStatus.DELETED,
+        or_(
+            QuizDB.form_status == FormStatus.PENDING,
+            and_(QuizDB.form_status == FormStatus.PROVISIONING, QuizDB.form_claimed_until < datetime.now())
+        )
+    )
+
+async def enqueue_pending_forms():
+    """Queue every quiz whose form still needs a worker, e.g. after a restart or an import"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(QuizDB.id).where(claimable_form()))
+        quiz_ids = result.scalars().all()
+    for quiz_id in quiz_ids:
+        enqueue_form(quiz_id)
+    return len(quiz_ids)
+
+async def claim_form(quiz_id: str):
+    """
+    Take a quiz's form job for this worker with one conditional UPDATE
+
+    Every worker process queues the same pending quizzes, but only one claim
+    succeeds, so only one of them calls Google. The claim is a lease: if its
+    worker dies, another one takes the job over once FORM_LEASE_SECONDS have
+    passed. Returns (lease, form_id of an earlier attempt) or None.
+    """
+    lease = datetime.now() + timedelta(seconds=FORM_LEASE_SECONDS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(QuizDB)
+            .where(QuizDB.id == quiz_id, claimable_form())
+            .values(form_status=FormStatus.PROVISIONING, form_claimed_until=lease, updated_at=datetime.now())
+            .returning(QuizDB.form_id)
+        )
+        claimed = result.first()
+        await db.commit()
+    if not claimed:
+        return None
+    invalidate_quiz_responses([quiz_id])
+    return lease, claimed.form_id
+
+async def update_claimed_form(quiz_id: str, lease, values):
+    """Update a quiz's form fields if this worker's claim on it still holds; returns whether it did"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(QuizDB)
+            .where(
+                QuizDB.id == quiz_id,
+                QuizDB.form_status == FormStatus.PROVISIONING,
+                QuizDB.form_claimed_until == lease
+            )
+            .values(**values, updated_at=datetime.now())
+        )
+        await db.commit()
+    invalidate_quiz_responses([quiz_id])
+    return result.rowcount == 1
+
+async def provision_form(quiz_id: str):
+    """
+    Create the Google Form of a pending quiz and store its ID and URL
+
+    The blocking Forms calls run on the Google API threads. The form ID is
+    stored as soon as the form exists, so a retry, or a worker taking over
+    after a crash, fills in that form instead of creating another one.
+    Failures are retried with a growing delay, and the quiz is marked FAILED
+    after FORM_MAX_ATTEMPTS.
+    """
+    claim = await claim_form(quiz_id)
+    if not claim:
+        return
+    lease, form_id = claim
+    async with AsyncSessionLocal() as db:
+        quiz = await db.get(QuizDB, quiz_id)
+        questions = [Question(**question) for question in (await load_questions_for_quizzes(db, [quiz_id]))[quiz_id]]
+
+    for attempt in range(1, FORM_MAX_ATTEMPTS + 1):
+        try:
+            resume = form_id is not None
+            if not resume:
+                form_id = await run_google_call(start_google_form, quiz.title)
+                if not await update_claimed_form(quiz_id, lease, {"form_id": form_id}):
+                    print(f"Lost the claim on quiz {quiz_id}, leaving Google Form {form_id} unused")
+                    return
+            form_url = await run_google_call(fill_google_form, form_id, questions, resume=resume)
+            await update_claimed_form(
+                quiz_id, lease, {"form_url": form_url, "form_status": FormStatus.READY, "form_claimed_until": None}
+            )
+            return
+        except Exception as e:
+            print(f"Error creating Google Form for quiz {quiz_id} (attempt {attempt}/{FORM_MAX_ATTEMPTS}): {e}")
+            if attempt < FORM_MAX_ATTEMPTS:
+                await asyncio.sleep(FORM_RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+    await update_claimed_form(quiz_id, lease, {"form_status": FormStatus.FAILED, "form_claimed_until": None})
+
+async def form_worker():
+    """Provision forms from the queue until cancelled"""
+    queue = form_queue
+    while True:
+        quiz_id = await queue.get()
+        try:
+            await provision_form(quiz_id)
+        except Exception as e:
+            print(f"Form provisioning for quiz {quiz_id} failed: {e}")
+        finally:
+            queued_quiz_ids.discard(quiz_id)
+            queue.task_done()
+
+async def requeue_abandoned_forms():
+    """Queue jobs whose worker died mid-way once their lease has run out, until cancelled"""
+    while True:
+        await asyncio.sleep(FORM_LEASE_SECONDS)
+        try:
+            await enqueue_pending_forms()
+        except Exception as e:
+            print(f"Requeueing abandoned Google Form jobs failed: {e}")
+
+async def start_form_workers(workers=FORM_WORKERS):
+    """Start the form workers and pick up forms left pending by a previous run"""
+    global form_queue
+    form_queue = asyncio.Queue()
+    form_workers.extend(asyncio.create_task(form_worker()) for _ in range(workers))
+    form_workers.append(asyncio.create_task(requeue_abandoned_forms()))
+    pending = await enqueue_pending_forms()
+    if pending:
+        print(f"Resuming {pending} pending Google Form jobs")
+
+async def stop_form_workers():
+    """Cancel the form workers; unfinished jobs stay pending and resume on the next start"""
+    global form_queue
+    form_queue = None
+    queued_quiz_ids.clear()
+    for worker in form_workers:
+        worker.cancel()
+    await asyncio.gather(*form_workers, return_exceptions=True)
+    form_workers.clear()
@@ -1,27 +1,74 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from routes import router
-from models import Base, engine
 from dotenv import load_dotenv
+# Load .env before models reads the database settings
 load_dotenv()
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from routes import router
+from models import Base, engine, READ_YOUR_WRITES_SECONDS, RECENT_WRITE_COOKIE
+from helpers import invalidate_quiz_responses
+from jobs import start_form_workers, stop_form_workers
+from google_clients import warm_up_google_clients, run_google_call
+from maintenance import BACKUP_INTERVAL_SECONDS, PURGE_INTERVAL_SECONDS, run_scheduled_snapshots, run_scheduled_purge
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load Google discovery documents and credentials before the first request needs them
+    if os.environ.get("GOOGLE_CLIENTS_WARM_UP", "true").lower() == "true":
+        await run_google_call(warm_up_google_clients)
+    await start_form_workers()
+    # Take periodic database snapshots and purge old deleted quizzes when configured
+    tasks = []
+    if BACKUP_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(run_scheduled_snapshots()))
+    if PURGE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(run_scheduled_purge(on_purged=invalidate_quiz_responses)))
+    yield
+    for task in tasks:
+        task.cancel()
+    await stop_form_workers()
+
 app = FastAPI(
     title="Google Forms Quiz System API",
     description="API for creating and managing quizzes using Google Forms",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Browsers only send the recent-write cookie to origins listed explicitly, never to "*"
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.environ.get("CORS_ORIGINS", "http://localhost:8080,http://127.0.0.1:8080").split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
+@app.middleware("http")
+async def mark_recent_writes(request: Request, call_next):
+    # Keep a client's reads on the primary for a few seconds after it changed something,
+    # so it never reads its own write back from a replica that hasn't caught up
+    response = await call_next(request)
+    if (
+        READ_YOUR_WRITES_SECONDS > 0
+        and request.method not in ("GET", "HEAD", "OPTIONS")
+        and response.status_code < 400
+    ):
+        response.set_cookie(RECENT_WRITE_COOKIE, "1", max_age=READ_YOUR_WRITES_SECONDS, httponly=True, samesite="lax")
+    return response
+
 app.include_router(router)
 
 if __name__ == "__main__":
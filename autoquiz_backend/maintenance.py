@@ -0,0 +1,380 @@
+# maintenance.py - Online snapshots and cleanup of the database
+import os
+import re
+import json
+import time
+import sqlite3
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.engine import make_url
+from fastapi.concurrency import run_in_threadpool
+from models import (
+    DATABASE_URL,
+    engine,
+    QuizDB,
+    QuizStatus,
+    QuestionBankDB,
+    QuizQuestionDB,
+    ArchivedQuizDB,
+    quiz_search_table
+)
+
+# Snapshot settings, read from the environment
+BACKUP_DIR = os.environ.get("BACKUP_DIR", "./backups")
+BACKUP_RETENTION = int(os.environ.get("BACKUP_RETENTION", 7))
+BACKUP_INTERVAL_SECONDS = int(os.environ.get("BACKUP_INTERVAL_SECONDS", 0))
+# Each step copies this many pages under a short read lock, then sleeps so writers can get in
+BACKUP_PAGES_PER_STEP = int(os.environ.get("BACKUP_PAGES_PER_STEP", 256))
+BACKUP_STEP_SLEEP = float(os.environ.get("BACKUP_STEP_SLEEP_MS", 5)) / 1000
+# A stepwise copy restarts whenever the source is written to, so give up after this long
+BACKUP_TIMEOUT_SECONDS = float(os.environ.get("BACKUP_TIMEOUT_SECONDS", 600))
+
+SNAPSHOT_NAME_PATTERN = re.compile(r"^autoforms-\d{8}T\d{6}(-\d+)?\.db$")
+
+def get_sqlite_path(url=DATABASE_URL):
+    """File path of a SQLite database URL, or None for other backends and in-memory databases"""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+def copy_database(
+    source_path,
+    target_path,
+    pages=BACKUP_PAGES_PER_STEP,
+    sleep=BACKUP_STEP_SLEEP,
+    timeout=BACKUP_TIMEOUT_SECONDS
+):
+    """
+    Copy one SQLite database into another with the online backup API
+
+    A WAL source is copied in a single step: its read transaction doesn't
+    block writers, and a stepwise copy would start over after every commit
+    and might never finish on a busy database. Other sources are copied a
+    few pages at a time, so writers are only held up for one step; that
+    copy raises TimeoutError if it hasn't finished after `timeout` seconds.
+    Returns the number of pages copied.
+    """
+    progress = {"pages": 0}
+    deadline = time.monotonic() + timeout
+
+    def record_progress(status, remaining, total):
+        progress["pages"] = total
+        if remaining and time.monotonic() > deadline:
+            raise TimeoutError(
+                f"Copying {os.path.basename(source_path)} didn't finish within {timeout:g}s "
+                f"({remaining} of {total} pages left); the database is probably being written to constantly"
+            )
+
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            pages = -1
+        source.backup(target, pages=pages, progress=record_progress, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+    return progress["pages"]
+
+def snapshot_info(path):
+    """Name, size and creation time of a snapshot file"""
+    stat = os.stat(path)
+    return {
+        "name": os.path.basename(path),
+        "size_bytes": stat.st_size,
+        "created_at": datetime.fromtimestamp(stat.st_mtime)
+    }
+
+def create_snapshot(source_path=None, backup_dir=BACKUP_DIR):
+    """
+    Take a consistent snapshot of the live database without stopping the service
+
+    The copy is written to a temporary file, checked, and then renamed into
+    place, so a half-written snapshot never shows up in the backup directory.
+    """
+    source_path = source_path or get_sqlite_path()
+    if source_path is None:
+        raise ValueError("Snapshots are only supported for file-backed SQLite databases")
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Database file {source_path} does not exist")
+
+    os.makedirs(backup_dir, exist_ok=True)
+    name = f"autoforms-{datetime.now():%Y%m%dT%H%M%S}.db"
+    suffix = 1
+    while os.path.exists(os.path.join(backup_dir, name)):
+        name = f"autoforms-{datetime.now():%Y%m%dT%H%M%S}-{suffix}.db"
+        suffix += 1
+
+    path = os.path.join(backup_dir, name)
+    partial_path = path + ".partial"
+    try:
+        copy_database(source_path, partial_path)
+        # A snapshot is a single self-contained file, not a WAL database
+        connection = sqlite3.connect(partial_path)
+        connection.execute("PRAGMA journal_mode=DELETE")
+        connection.close()
+        check_snapshot(partial_path)
+        os.replace(partial_path, path)
+    except Exception:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    print(f"Created database snapshot {path}")
+    return snapshot_info(path)
+
+def check_snapshot(path):
+    """Raise ValueError unless the file is an intact SQLite database"""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        result = connection.execute("PRAGMA quick_check").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"{os.path.basename(path)} is not a valid database: {e}")
+    finally:
+        connection.close()
+    if result != "ok":
+        raise ValueError(f"{os.path.basename(path)} failed its integrity check: {result}")
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    """All snapshots in the backup directory, newest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    snapshots = [
+        snapshot_info(os.path.join(backup_dir, name))
+        for name in os.listdir(backup_dir)
+        if SNAPSHOT_NAME_PATTERN.match(name)
+    ]
+    return sorted(snapshots, key=lambda snapshot: (snapshot["created_at"], snapshot["name"]), reverse=True)
+
+def prune_snapshots(keep=BACKUP_RETENTION, backup_dir=BACKUP_DIR):
+    """Delete all but the newest `keep` snapshots and return the names removed"""
+    removed = []
+    for snapshot in list_snapshots(backup_dir)[max(keep, 0):]:
+        os.remove(os.path.join(backup_dir, snapshot["name"]))
+        removed.append(snapshot["name"])
+    if removed:
+        print(f"Pruned {len(removed)} old database snapshots")
+    return removed
+
+def get_snapshot_path(name, backup_dir=BACKUP_DIR):
+    """Path of a named snapshot, rejecting anything that isn't one of ours"""
+    path = os.path.join(backup_dir, name)
+    if not SNAPSHOT_NAME_PATTERN.match(name) or not os.path.exists(path):
+        raise FileNotFoundError(f"Snapshot {name} not found")
+    return path
+
+def restore_snapshot(name, target_path=None, backup_dir=BACKUP_DIR):
+    """
+    Copy a snapshot back over the live database
+
+    The backup API writes into the open database under SQLite's own locking,
+    so connections held by the engines see the restored data on their next
+    transaction. The sync engine's pool is still dropped afterwards so nothing
+    keeps cached schema from before the restore; async callers should dispose
+    `async_engine` the same way.
+    """
+    target_path = target_path or get_sqlite_path()
+    if target_path is None:
+        raise ValueError("Snapshots are only supported for file-backed SQLite databases")
+    path = get_snapshot_path(name, backup_dir)
+    check_snapshot(path)
+
+    copy_database(path, target_path)
+    engine.dispose()
+    print(f"Restored database from snapshot {name}")
+    return snapshot_info(path)
+
+async def run_scheduled_snapshots(interval=BACKUP_INTERVAL_SECONDS):
+    """Take and prune snapshots every `interval` seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(create_snapshot)
+            await run_in_threadpool(prune_snapshots)
+        except Exception as e:
+            print(f"Scheduled database snapshot failed: {str(e)}")
+
+# Purge settings, read from the environment
+PURGE_RETENTION_DAYS = int(os.environ.get("PURGE_RETENTION_DAYS", 30))
+PURGE_INTERVAL_SECONDS = int(os.environ.get("PURGE_INTERVAL_SECONDS", 0))
+PURGE_BATCH_SIZE = int(os.environ.get("PURGE_BATCH_SIZE", 500))
+PURGE_ARCHIVE = os.environ.get("PURGE_ARCHIVE", "none")  # none, table or file
+PURGE_ARCHIVE_DIR = os.environ.get("PURGE_ARCHIVE_DIR", "./archive")
+# Free pages handed back to the filesystem per incremental vacuum step
+VACUUM_PAGES_PER_STEP = int(os.environ.get("VACUUM_PAGES_PER_STEP", 1000))
+
+def load_archive_documents(connection, quiz_ids):
+    """The quizzes and their questions as JSON-ready dicts, in the shape of the export"""
+    quizzes = connection.execute(select(QuizDB.__table__).where(QuizDB.id.in_(quiz_ids))).mappings().all()
+    questions = {quiz_id: [] for quiz_id in quiz_ids}
+    rows = connection.execute(
+        select(QuizQuestionDB.quiz_id, QuestionBankDB.text, QuestionBankDB.options, QuestionBankDB.correct_answer_index)
+        .join(QuestionBankDB, QuestionBankDB.id == QuizQuestionDB.question_id)
+        .where(QuizQuestionDB.quiz_id.in_(quiz_ids))
+        .order_by(QuizQuestionDB.quiz_id, QuizQuestionDB.position)
+    )
+    for quiz_id, text, options, correct_answer_index in rows:
+        questions[quiz_id].append({
+            "text": text,
+            "options": json.loads(options),
+            "correct_answer_index": correct_answer_index
+        })
+    
+    documents = []
+    for quiz in quizzes:
+        document = dict(quiz)
+        # A form job's lease means nothing once the quiz is gone
+        document.pop("form_claimed_until", None)
+        document["status"] = quiz["status"].value
+        document["created_at"] = quiz["created_at"].isoformat()
+        document["updated_at"] = quiz["updated_at"].isoformat()
+        document["questions"] = questions[quiz["id"]]
+        documents.append(document)
+    return documents
+
+def archive_quizzes(connection, documents, archive, archive_dir):
+    """Copy purged quizzes to the archive table or append them to today's NDJSON file"""
+    if archive == "table":
+        connection.execute(insert(ArchivedQuizDB), [
+            {
+                "id": document["id"],
+                "data": json.dumps(document, ensure_ascii=False),
+                "deleted_at": datetime.fromisoformat(document["updated_at"]),
+                "archived_at": datetime.now()
+            }
+            for document in documents
+        ])
+    elif archive == "file":
+        os.makedirs(archive_dir, exist_ok=True)
+        path = os.path.join(archive_dir, f"deleted-quizzes-{datetime.now():%Y%m%d}.ndjson")
+        # Flushed to disk before the rows are deleted, so a crash can repeat a
+        # quiz in the archive but never lose one
+        with open(path, "a", encoding="utf-8") as archive_file:
+            for document in documents:
+                archive_file.write(json.dumps(document, ensure_ascii=False) + "\n")
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+
+def purge_batch(connection, quiz_ids):
+    """
+    Hard-delete a batch of quizzes with one statement per table
+
+    Links go first, then the search rows and quizzes, then any bank questions
+    no remaining quiz links to. Returns the number of bank questions removed.
+    """
+    question_ids = connection.execute(
+        select(QuizQuestionDB.question_id).where(QuizQuestionDB.quiz_id.in_(quiz_ids)).distinct()
+    ).scalars().all()
+    
+    connection.execute(delete(QuizQuestionDB).where(QuizQuestionDB.quiz_id.in_(quiz_ids)))
+    if connection.dialect.name == "sqlite":
+        connection.execute(delete(quiz_search_table).where(quiz_search_table.c.quiz_id.in_(quiz_ids)))
+    connection.execute(delete(QuizDB).where(QuizDB.id.in_(quiz_ids)))
+    
+    if not question_ids:
+        return 0
+    still_linked = exists().where(QuizQuestionDB.question_id == QuestionBankDB.id)
+    result = connection.execute(
+        delete(QuestionBankDB).where(QuestionBankDB.id.in_(question_ids), ~still_linked)
+    )
+    return result.rowcount
+
+def purge_deleted_quizzes(
+    retention_days=PURGE_RETENTION_DAYS,
+    batch_size=PURGE_BATCH_SIZE,
+    archive=PURGE_ARCHIVE,
+    archive_dir=PURGE_ARCHIVE_DIR
+):
+    """
+    Permanently remove quizzes that have been deleted for longer than the retention period
+
+    Work is done in transactions of at most `batch_size` quizzes so writers are
+    never locked out for long. PostgreSQL locks the batch with FOR UPDATE;
+    on SQLite each batch takes the write lock with BEGIN IMMEDIATE before it
+    is selected. Either way no quiz can be restored between being picked
+    and being purged. Returns the purged quiz IDs and the number of bank
+    questions freed.
+    """
+    if archive not in ("none", "table", "file"):
+        raise ValueError(f"Unknown archive target {archive}, expected none, table or file")
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    expired = (QuizDB.status == QuizStatus.DELETED) & (QuizDB.updated_at < cutoff)
+    
+    purged_ids = []
+    freed_questions = 0
+    while True:
+        with engine.begin() as connection:
+            if connection.dialect.name == "sqlite":
+                # pysqlite only sends BEGIN before the first write, which would
+                # leave the SELECT below outside the transaction
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            quiz_ids = connection.execute(
+                select(QuizDB.id).where(expired).order_by(QuizDB.updated_at).limit(batch_size).with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not quiz_ids:
+                break
+            if archive != "none":
+                archive_quizzes(connection, load_archive_documents(connection, quiz_ids), archive, archive_dir)
+            freed_questions += purge_batch(connection, quiz_ids)
+        purged_ids.extend(quiz_ids)
+    
+    if purged_ids:
+        print(f"Purged {len(purged_ids)} deleted quizzes and {freed_questions} unused questions")
+    return purged_ids, freed_questions
+
+def incremental_vacuum(pages_per_step=VACUUM_PAGES_PER_STEP):
+    """
+    Hand free pages back to the filesystem a few at a time
+
+    Only works once the database uses auto_vacuum=INCREMENTAL; databases
+    created before that need a one-off full VACUUM. Returns the number of
+    pages released.
+    """
+    if engine.dialect.name != "sqlite":
+        return 0
+    with engine.connect() as connection:
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            print("Skipping incremental vacuum: the database needs a one-off VACUUM to enable auto_vacuum=INCREMENTAL")
+            return 0
+        connection.commit()
+        # sqlite3's execute() only runs one step of the pragma, freeing a single
+        # page; executescript() runs it to completion
+        dbapi_connection = connection.connection.dbapi_connection
+        released = 0
+        while True:
+            free_pages = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+            connection.commit()
+            if not free_pages:
+                break
+            step = min(free_pages, pages_per_step)
+            dbapi_connection.executescript(f"PRAGMA incremental_vacuum({step})")
+            released += step
+    return released
+
+def vacuum_database():
+    """Rebuild the whole database file, switching it to auto_vacuum=INCREMENTAL on the way"""
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+
+def run_purge(**kwargs):
+    """Purge expired quizzes and shrink the database file; returns the purged quiz IDs"""
+    purged_ids, _ = purge_deleted_quizzes(**kwargs)
+    if purged_ids:
+        incremental_vacuum()
+    return purged_ids
+
+async def run_scheduled_purge(interval=PURGE_INTERVAL_SECONDS, on_purged=None):
+    """Purge expired quizzes every `interval` seconds until cancelled, reporting purged IDs to `on_purged`"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged_ids = await run_in_threadpool(run_purge)
+            if purged_ids and on_purged:
+                on_purged(purged_ids)
+        except Exception as e:
+            print(f"Scheduled purge of deleted quizzes failed: {str(e)}")
@@ -1,26 +1,148 @@
 # models.py - Updated version with SQLAlchemy models
 
+import os
+import json
+import hashlib
+from fastapi import Request
 from pydantic import BaseModel
 from typing import Optional, List
 from pydantic import Field
 from enum import Enum
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SQLAEnum, create_engine
+from sqlalchemy import Column, Float, Integer, String, DateTime, ForeignKey, Index, Enum as SQLAEnum, column, create_engine, event, insert, inspect, select, table
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import relationship, sessionmaker
 
+# Database configuration, read from the environment
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./autoforms.db")
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "production")
+READ_DATABASE_URL = os.environ.get("READ_DATABASE_URL")
+# After a write, a client's reads stay on the primary this long so it sees its own changes
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", 5))
+RECENT_WRITE_COOKIE = "autoquiz_recent_write"
+
+# PRAGMAs applied to every new SQLite connection, per profile
+SQLITE_PROFILES = {
+    # WAL lets readers run alongside a writer, NORMAL only fsyncs at checkpoints
+    "production": {
+        # Only takes effect on new databases; existing ones need a one-off VACUUM
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+        "foreign_keys": "ON",
+    },
+    # SQLite's own defaults, apart from waiting on locks and enforcing foreign keys
+    "default": {
+        "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+        "foreign_keys": "ON",
+    },
+}
+
+# Async driver for each backend's sync URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def get_async_database_url(url):
+    """Map a sync database URL onto the matching async driver"""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+def get_engine_options(url):
+    """Engine keyword arguments for the backend of a database URL"""
+    if make_url(url).get_backend_name() == "postgresql":
+        return {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+            "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+            "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+            "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+            "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true",
+        }
+    return {}
+
+# PRAGMAs stored in the database file, which only the primary connection may set
+SQLITE_FILE_PRAGMAS = {"auto_vacuum", "journal_mode"}
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the configured SQLite profile to a freshly opened connection"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PROFILES[SQLITE_PROFILE].items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def apply_read_only_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the per-connection part of the profile to a read-only connection"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PROFILES[SQLITE_PROFILE].items():
+        if name not in SQLITE_FILE_PRAGMAS:
+            cursor.execute(f"PRAGMA {name}={value}")
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def create_database_engine(url=DATABASE_URL, read_only=False):
+    """Create a sync engine tuned for the backend of the URL"""
+    db_engine = create_engine(url, **get_engine_options(url))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(db_engine, "connect", apply_read_only_sqlite_pragmas if read_only else apply_sqlite_pragmas)
+    return db_engine
+
+def create_async_database_engine(url=DATABASE_URL, read_only=False):
+    """Create an async engine tuned for the backend of the URL"""
+    db_engine = create_async_engine(get_async_database_url(url), **get_engine_options(url))
+    if db_engine.dialect.name == "sqlite":
+        event.listen(
+            db_engine.sync_engine, "connect", apply_read_only_sqlite_pragmas if read_only else apply_sqlite_pragmas
+        )
+    return db_engine
+
+def get_read_database_url(url=DATABASE_URL):
+    """
+    URL the read-only engine connects to
+
+    READ_DATABASE_URL points reads at a replica. Without one, a file-backed
+    SQLite database is opened a second time in read-only mode, so reads get
+    their own connection pool; other databases share the primary engine.
+    """
+    if READ_DATABASE_URL:
+        return READ_DATABASE_URL
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:"):
+        return url.set(database=f"file:{url.database}", query={"mode": "ro", "uri": "true"})
+    return None
+
 # SQLAlchemy setup
-DATABASE_URL = "sqlite:///./autoforms.db"
-engine = create_engine(DATABASE_URL)
+engine = create_database_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine used by the FastAPI routes so queries don't block the event loop
+async_engine = create_async_database_engine()
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# Read-only engine for GET routes, falling back to the primary when there's nothing to split off
+read_database_url = get_read_database_url()
+read_async_engine = create_async_database_engine(read_database_url, read_only=True) if read_database_url else async_engine
+AsyncReadSessionLocal = async_sessionmaker(bind=read_async_engine, autoflush=False, expire_on_commit=False)
+
 # Pydantic models
 class QuizStatus(str, Enum):
     DRAFT = "draft"
     APPROVED = "approved"
     DELETED = "deleted"
 
+class FormStatus(str, Enum):
+    PENDING = "pending"
+    PROVISIONING = "provisioning"
+    READY = "ready"
+    FAILED = "failed"
+
 class Question(BaseModel):
     text: str
     options: List[str]
@@ -38,8 +160,11 @@ class QuizResponse(BaseModel):
     status: QuizStatus
     form_url: Optional[str] = None
     form_id: Optional[str] = None
+    form_status: Optional[FormStatus] = None
     created_at: datetime
     updated_at: datetime
+    questions: List[Question] = Field(default_factory=list)
+    question_count: Optional[int] = None
 
 class EmailRecipients(BaseModel):
     recipients: List[str] = Field(..., description="List of email addresses to send the quiz to")
@@ -54,24 +179,249 @@ class QuizDB(Base):
     status = Column(SQLAEnum(QuizStatus), default=QuizStatus.DRAFT)
     form_url = Column(String, nullable=True)
     form_id = Column(String, nullable=True)
+    form_status = Column(SQLAEnum(FormStatus, native_enum=False), nullable=True)  # None when no form was requested
+    form_claimed_until = Column(DateTime, nullable=True)  # Lease of the worker provisioning the form
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
-    questions = relationship("QuestionDB", back_populates="quiz", cascade="all, delete-orphan")
+    questions = relationship(
+        "QuizQuestionDB", back_populates="quiz", cascade="all, delete-orphan", order_by="QuizQuestionDB.position"
+    )
+
+    # Keyset pagination walks these in (created_at, id) order, with or without a status filter
+    __table_args__ = (
+        Index("ix_quizzes_status_created_at", "status", "created_at", "id"),
+        Index("ix_quizzes_created_at", "created_at", "id"),
+        # Incremental exports read everything changed since a point in time
+        Index("ix_quizzes_updated_at", "updated_at", "id"),
+        # Startup looks up the quizzes still waiting for a Google Form
+        Index("ix_quizzes_form_status", "form_status"),
+    )
 
-class QuestionDB(Base):
-    __tablename__ = "questions"
+def question_content_hash(text: str, options: str, correct_answer_index: int):
+    """Content address of a question: SHA-256 of its text, JSON options and answer"""
+    content = json.dumps([text, options, correct_answer_index], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+# Every distinct question is stored once and shared by the quizzes that contain it
+class QuestionBankDB(Base):
+    __tablename__ = "question_bank"
     
-    id = Column(Integer, primary_key=True, index=True)
-    quiz_id = Column(String, ForeignKey("quizzes.id"))
+    id = Column(Integer, primary_key=True)
+    content_hash = Column(String(64), nullable=False, unique=True)  # SHA-256 of text, options and answer
     text = Column(String, nullable=False)
     options = Column(String, nullable=False)  # Stored as JSON string
     correct_answer_index = Column(Integer, nullable=False)
+
+# Links a quiz to its questions in order
+class QuizQuestionDB(Base):
+    __tablename__ = "quiz_questions"
+    
+    quiz_id = Column(String, ForeignKey("quizzes.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    question_id = Column(Integer, ForeignKey("question_bank.id"), nullable=False, index=True)
     
     quiz = relationship("QuizDB", back_populates="questions")
+    question = relationship("QuestionBankDB")
+
+# Cold storage for deleted quizzes purged from the hot tables, one JSON document per quiz
+class ArchivedQuizDB(Base):
+    __tablename__ = "archived_quizzes"
+    
+    id = Column(String, primary_key=True)
+    data = Column(String, nullable=False)  # The quiz and its questions as a JSON string
+    deleted_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.now)
 
-# Create tables
+# Token buckets shared by every worker process, one row per rate-limited Google API
+class ApiRateLimitDB(Base):
+    __tablename__ = "api_rate_limits"
+    
+    api = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    refilled_at = Column(Float, nullable=False)  # Unix time of the last refill
+
+class QuizStatusCountDB(Base):
+    __tablename__ = "quiz_status_counts"
+    
+    status = Column(SQLAEnum(QuizStatus), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+# Triggers keeping quiz_status_counts in step with every insert, status change
+# and delete on quizzes, inside the transaction that made the change
+QUIZ_STATUS_COUNT_TRIGGERS = {
+    "sqlite": [
+        """
+        CREATE TRIGGER IF NOT EXISTS quizzes_count_insert AFTER INSERT ON quizzes
+        BEGIN
+            INSERT INTO quiz_status_counts (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET count = count + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS quizzes_count_update AFTER UPDATE OF status ON quizzes
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE quiz_status_counts SET count = count - 1 WHERE status = OLD.status;
+            INSERT INTO quiz_status_counts (status, count) VALUES (NEW.status, 1)
+            ON CONFLICT (status) DO UPDATE SET count = count + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS quizzes_count_delete AFTER DELETE ON quizzes
+        BEGIN
+            UPDATE quiz_status_counts SET count = count - 1 WHERE status = OLD.status;
+        END
+        """,
+    ],
+    "postgresql": [
+        """
+        CREATE OR REPLACE FUNCTION quizzes_count_status() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE quiz_status_counts SET count = count - 1 WHERE status = OLD.status;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO quiz_status_counts (status, count) VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET count = quiz_status_counts.count + 1;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE TRIGGER quizzes_count_insert_delete AFTER INSERT OR DELETE ON quizzes
+        FOR EACH ROW EXECUTE FUNCTION quizzes_count_status()
+        """,
+        """
+        CREATE OR REPLACE TRIGGER quizzes_count_update AFTER UPDATE OF status ON quizzes
+        FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status) EXECUTE FUNCTION quizzes_count_status()
+        """,
+    ],
+}
+
+@event.listens_for(Base.metadata, "after_create")
+def install_quiz_status_counters(target, connection, tables=(), **kw):
+    """Create the counter triggers, and fill the counters in when their table is new"""
+    for statement in QUIZ_STATUS_COUNT_TRIGGERS.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+    if QuizStatusCountDB.__table__ in tables:
+        connection.exec_driver_sql(
+            "INSERT INTO quiz_status_counts (status, count) SELECT status, count(*) FROM quizzes GROUP BY status"
+        )
+
+# SQLite FTS5 index over quiz titles, descriptions and question text, one row
+# per quiz. It is kept in sync by the write helpers rather than the ORM.
+quiz_search_table = table(
+    "quiz_search",
+    column("quiz_id"),
+    column("title"),
+    column("description"),
+    column("questions"),
+)
+
+# Fills quiz_search from the quizzes and the text of their questions
+QUIZ_SEARCH_BACKFILL = """
+    INSERT INTO quiz_search (quiz_id, title, description, questions)
+    SELECT quizzes.id, quizzes.title, coalesce(quizzes.description, ''),
+           coalesce(group_concat(question_bank.text, char(10)), '')
+    FROM quizzes
+    LEFT JOIN quiz_questions ON quiz_questions.quiz_id = quizzes.id
+    LEFT JOIN question_bank ON question_bank.id = quiz_questions.question_id
+    GROUP BY quizzes.id
+"""
+
+@event.listens_for(Base.metadata, "after_create")
+def install_quiz_search_index(target, connection, **kw):
+    """Create the quiz_search index on SQLite, and index the existing quizzes when it is new"""
+    if connection.dialect.name != "sqlite" or inspect(connection).has_table("quiz_search"):
+        return
+    connection.exec_driver_sql(
+        "CREATE VIRTUAL TABLE quiz_search USING fts5("
+        "quiz_id UNINDEXED, title, description, questions, tokenize='porter unicode61')"
+    )
+    connection.exec_driver_sql(QUIZ_SEARCH_BACKFILL)
+
+def add_quiz_form_status_column(connection):
+    """Add form_status to a quizzes table created before forms were provisioned in the background"""
+    if "form_status" in {column["name"] for column in inspect(connection).get_columns("quizzes")}:
+        return
+    connection.exec_driver_sql("ALTER TABLE quizzes ADD COLUMN form_status VARCHAR(12)")
+    connection.exec_driver_sql("UPDATE quizzes SET form_status = 'READY' WHERE form_url IS NOT NULL")
+    connection.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_quizzes_form_status ON quizzes (form_status)")
+
+def add_quiz_form_claim_column(connection):
+    """Add the form job lease to a quizzes table created before form jobs were claimed"""
+    columns = {column["name"]: column for column in inspect(connection).get_columns("quizzes")}
+    if "form_claimed_until" not in columns:
+        column_type = DateTime().compile(dialect=connection.dialect)
+        connection.exec_driver_sql(f"ALTER TABLE quizzes ADD COLUMN form_claimed_until {column_type}")
+    # Enum names are stored as strings sized to the longest name, which PROVISIONING outgrew
+    if connection.dialect.name == "postgresql" and (columns["form_status"]["type"].length or 0) < len("PROVISIONING"):
+        connection.exec_driver_sql("ALTER TABLE quizzes ALTER COLUMN form_status TYPE VARCHAR(12)")
+
+def migrate_legacy_questions(connection, batch_size=5000):
+    """
+    Move questions out of the old per-quiz `questions` table into the question bank
+
+    Identical questions collapse into one bank row and every quiz keeps its
+    question order. The old table is dropped once everything is linked, and
+    the search index is rebuilt with the migrated question text. Returns the
+    number of questions migrated.
+    """
+    if not inspect(connection).has_table("questions"):
+        return 0
+    
+    rows = connection.execution_options(yield_per=batch_size).exec_driver_sql(
+        "SELECT quiz_id, text, options, correct_answer_index FROM questions ORDER BY quiz_id, id"
+    )
+    if connection.dialect.name == "postgresql":
+        bank_insert = postgresql_insert(QuestionBankDB.__table__)
+    else:
+        bank_insert = sqlite_insert(QuestionBankDB.__table__)
+    bank_insert = bank_insert.on_conflict_do_nothing(index_elements=["content_hash"])
+    
+    positions = {}
+    migrated = 0
+    for batch in rows.partitions():
+        bank_rows = {}
+        links = []
+        for quiz_id, question_text, options, correct_answer_index in batch:
+            content_hash = question_content_hash(question_text, options, correct_answer_index)
+            bank_rows[content_hash] = {
+                "content_hash": content_hash,
+                "text": question_text,
+                "options": options,
+                "correct_answer_index": correct_answer_index
+            }
+            position = positions.get(quiz_id, 0)
+            positions[quiz_id] = position + 1
+            links.append((quiz_id, position, content_hash))
+        
+        connection.execute(bank_insert, list(bank_rows.values()))
+        question_ids = dict(connection.execute(
+            select(QuestionBankDB.content_hash, QuestionBankDB.id)
+            .where(QuestionBankDB.content_hash.in_(list(bank_rows)))
+        ).all())
+        connection.execute(insert(QuizQuestionDB.__table__), [
+            {"quiz_id": quiz_id, "position": position, "question_id": question_ids[content_hash]}
+            for quiz_id, position, content_hash in links
+        ])
+        migrated += len(links)
+    
+    connection.exec_driver_sql("DROP TABLE questions")
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DELETE FROM quiz_search")
+        connection.exec_driver_sql(QUIZ_SEARCH_BACKFILL)
+    print(f"Migrated {migrated} questions into the question bank")
+    return migrated
+
+# Create tables, then bring databases made by earlier versions up to date
 Base.metadata.create_all(bind=engine)
+with engine.begin() as connection:
+    add_quiz_form_status_column(connection)
+    add_quiz_form_claim_column(connection)
+    migrate_legacy_questions(connection)
 
 # Helper function to get db session
 def get_db():
@@ -79,4 +429,20 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Helper function to get an async db session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def get_read_sessionmaker(request: Request):
+    """Session factory for a read: the replica, unless this client wrote recently"""
+    if READ_YOUR_WRITES_SECONDS > 0 and request.cookies.get(RECENT_WRITE_COOKIE):
+        return AsyncSessionLocal
+    return AsyncReadSessionLocal
+
+# Helper function to get an async db session for read-only routes
+async def get_async_read_db(request: Request):
+    async with get_read_sessionmaker(request)() as db:
+        yield db
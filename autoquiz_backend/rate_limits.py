@@ -0,0 +1,211 @@
+# rate_limits.py - Client-side rate limiting and backoff for Google API calls
+import os
+import time
+import json
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from googleapiclient.errors import HttpError
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from models import engine, ApiRateLimitDB
+
+# Requests per minute allowed for each Google API, read from the environment
+GOOGLE_RATE_LIMITS = {
+    "forms": float(os.environ.get("FORMS_REQUESTS_PER_MINUTE", 300)),
+    "gmail": float(os.environ.get("GMAIL_REQUESTS_PER_MINUTE", 60)),
+}
+# How many seconds of unused quota can build up into a burst
+GOOGLE_RATE_LIMIT_BURST_SECONDS = float(os.environ.get("GOOGLE_RATE_LIMIT_BURST_SECONDS", 10))
+# "process" gives every process its own limits; "shared" draws on buckets in the database
+GOOGLE_RATE_LIMIT_SCOPE = os.environ.get("GOOGLE_RATE_LIMIT_SCOPE", "process")
+# Tokens a process takes from a shared bucket at a time
+GOOGLE_RATE_LIMIT_GRANT = int(os.environ.get("GOOGLE_RATE_LIMIT_GRANT", 5))
+GOOGLE_MAX_ATTEMPTS = int(os.environ.get("GOOGLE_MAX_ATTEMPTS", 5))
+GOOGLE_BACKOFF_BASE_SECONDS = float(os.environ.get("GOOGLE_BACKOFF_BASE_SECONDS", 1))
+GOOGLE_BACKOFF_MAX_SECONDS = float(os.environ.get("GOOGLE_BACKOFF_MAX_SECONDS", 64))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# 403 reasons Google uses for quota errors instead of a 429
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+def bucket_settings(api):
+    """(tokens added per second, bucket capacity) for an API"""
+    rate = GOOGLE_RATE_LIMITS[api] / 60
+    return rate, max(1.0, rate * GOOGLE_RATE_LIMIT_BURST_SECONDS)
+
+def refill(tokens, refilled_at, now, rate, capacity):
+    """Tokens in a bucket at `now`"""
+    return min(capacity, tokens + (now - refilled_at) * rate)
+
+# This process's buckets: api -> [tokens, refilled_at]. In shared mode they
+# hold tokens granted from the database, otherwise they refill on their own.
+local_buckets = {}
+local_buckets_lock = threading.Lock()
+
+def take_local_token(api, now):
+    """Take a token from this process's own bucket, returning the seconds to wait if it's empty"""
+    rate, capacity = bucket_settings(api)
+    with local_buckets_lock:
+        bucket = local_buckets.setdefault(api, [capacity, now])
+        bucket[0] = refill(bucket[0], bucket[1], now, rate, capacity)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / rate
+
+def take_shared_tokens(api, now, wanted):
+    """
+    Take up to `wanted` whole tokens from the API's bucket in the database
+
+    The bucket row is locked for the read and the update (BEGIN IMMEDIATE on
+    SQLite, FOR UPDATE elsewhere), so worker processes can't both spend the
+    same tokens. Returns (tokens taken, seconds until one is available).
+    """
+    rate, capacity = bucket_settings(api)
+    with engine.begin() as connection:
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            create_bucket = sqlite_insert(ApiRateLimitDB)
+        else:
+            create_bucket = postgresql_insert(ApiRateLimitDB)
+        connection.execute(
+            create_bucket.values(api=api, tokens=capacity, refilled_at=now).on_conflict_do_nothing(index_elements=["api"])
+        )
+        tokens, refilled_at = connection.execute(
+            select(ApiRateLimitDB.tokens, ApiRateLimitDB.refilled_at).where(ApiRateLimitDB.api == api).with_for_update()
+        ).one()
+        tokens = refill(tokens, refilled_at, now, rate, capacity)
+        if tokens < 1:
+            return 0, (1 - tokens) / rate
+        taken = min(wanted, int(tokens))
+        connection.execute(
+            update(ApiRateLimitDB).where(ApiRateLimitDB.api == api).values(tokens=tokens - taken, refilled_at=now)
+        )
+    return taken, 0
+
+def take_granted_token(api, now):
+    """
+    Take a token granted to this process from the shared bucket
+
+    Tokens are granted GOOGLE_RATE_LIMIT_GRANT at a time, so the database is
+    written once per batch of calls rather than on every call.
+    """
+    with local_buckets_lock:
+        bucket = local_buckets.setdefault(api, [0, now])
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        taken, wait = take_shared_tokens(api, now, GOOGLE_RATE_LIMIT_GRANT)
+        if taken:
+            bucket[0] = taken - 1
+        return wait
+
+def acquire_token(api):
+    """Block until the API's rate limit allows one more request"""
+    while True:
+        now = time.time()
+        if GOOGLE_RATE_LIMIT_SCOPE == "shared":
+            try:
+                wait = take_granted_token(api, now)
+            except SQLAlchemyError as e:
+                print(f"Rate limit table unavailable, limiting {api} per process: {e}")
+                wait = take_local_token(api, now)
+        else:
+            wait = take_local_token(api, now)
+        if wait <= 0:
+            return
+        time.sleep(wait)
+
+def pause_api(api, seconds):
+    """Empty the API's bucket so calls hold off for `seconds`, e.g. after a 429"""
+    rate, _ = bucket_settings(api)
+    now = time.time()
+    if GOOGLE_RATE_LIMIT_SCOPE == "shared":
+        try:
+            with engine.begin() as connection:
+                connection.execute(
+                    update(ApiRateLimitDB)
+                    .where(ApiRateLimitDB.api == api)
+                    .values(tokens=-seconds * rate, refilled_at=now)
+                )
+        except SQLAlchemyError:
+            pass
+    with local_buckets_lock:
+        local_buckets[api] = [-seconds * rate, now]
+
+def get_retry_after(error):
+    """Seconds from an error's Retry-After header, or None"""
+    value = error.resp.get("retry-after") if isinstance(error, HttpError) else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def is_rate_limit_error(error):
+    """Whether an error means the API's quota ran out"""
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    if error.resp.status == 403:
+        try:
+            errors = json.loads(error.content).get("error", {}).get("errors", [])
+        except (ValueError, AttributeError):
+            return False
+        return any(detail.get("reason") in RATE_LIMIT_REASONS for detail in errors)
+    return False
+
+def is_retryable(error, idempotent):
+    """
+    Whether a failed Google API call is worth sending again
+
+    A rate limit error means the call was turned away, so it is always safe
+    to repeat. A 5xx or a dropped connection may come after the call was
+    applied, so only idempotent calls are repeated then.
+    """
+    if is_rate_limit_error(error):
+        return True
+    if not idempotent:
+        return False
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUS_CODES
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(GOOGLE_BACKOFF_MAX_SECONDS, GOOGLE_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, GOOGLE_BACKOFF_BASE_SECONDS)
+    return delay
+
+def execute_google_request(api, request, idempotent=False, max_attempts=GOOGLE_MAX_ATTEMPTS):
+    """
+    Execute a googleapiclient request under the API's rate limit, retrying transient errors
+
+    Every attempt waits for a token first. On a 429 or quota 403 the bucket
+    is emptied for the backoff period, so other threads (and, in shared mode,
+    processes) slow down too instead of piling on more failing requests.
+    Pass `idempotent` for reads; other calls are only retried after rate
+    limit errors, so a create is never sent twice.
+    """
+    for attempt in range(1, max_attempts + 1):
+        acquire_token(api)
+        try:
+            return request.execute()
+        except Exception as e:
+            if attempt == max_attempts or not is_retryable(e, idempotent):
+                raise
+            delay = backoff_delay(attempt, get_retry_after(e))
+            if is_rate_limit_error(e):
+                pause_api(api, delay)
+            print(f"Google {api} request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
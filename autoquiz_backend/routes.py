@@ -1,22 +1,60 @@
+import os
+import hmac
 from models import *
-from fastapi import FastAPI, HTTPException, Query, Body, Path, Depends
+from fastapi import FastAPI, HTTPException, Query, Body, Path, Depends, Header, Request
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from starlette.responses import HTMLResponse
+from schema import QuizListResponse, QuizBatchResponse, BulkQuizIds, BulkStatusUpdate, BulkOperationResponse, QuizImportResponse, QuizStatsResponse, SnapshotInfo, SnapshotListResponse, PurgeResponse
+import maintenance
+from jobs import enqueue_form, enqueue_pending_forms
+from google_clients import run_google_call
 
 
 from helpers import (
-    create_google_form, 
     send_email_notification, 
-    get_db, 
+    get_async_db,
+    get_async_read_db,
+    get_read_sessionmaker,
     get_quiz_by_id,
     get_all_quizzes,
+    get_quiz_list_version,
+    get_quiz_status_counts,
+    total_for_status,
+    make_etag,
+    format_http_date,
+    is_not_modified,
+    search_quizzes_in_db,
+    encode_offset_cursor,
+    decode_offset_cursor,
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
     create_quiz_in_db,
-    update_quiz_status,
+    transition_quiz_status,
+    request_quiz_form,
+    ALLOWED_STATUS_TRANSITIONS,
     convert_db_quiz_to_response,
+    hydrate_quiz_responses,
+    build_quiz_responses,
+    resolve_quiz_fields,
+    get_quiz_version,
+    get_quizzes_by_ids,
+    MAX_BATCH_IDS,
+    bulk_update_quiz_status,
+    stream_quiz_export,
+    read_import_records,
+    import_quizzes_in_db,
+    IMPORT_BATCH_SIZE,
+    MAX_IMPORT_BATCH_SIZE,
+    cache_quiz_response,
+    get_cached_quiz_response,
+    invalidate_quiz_responses,
+    clear_quiz_responses,
     get_google_form_details
 )
 
@@ -29,32 +67,181 @@ def sayHello():
 
 # Routes
 @router.post("/quizzes/", response_model=QuizResponse, status_code=201)
-async def create_quiz(quiz: QuizCreate = Body(...), db: Session = Depends(get_db)):
+async def create_quiz(quiz: QuizCreate = Body(...), db: AsyncSession = Depends(get_async_db)):
     """
     Create a new quiz in draft status
+
+    The Google Form is created in the background; form_status shows its progress.
     """
-    # Create Google Form
-    form_id, form_url = None, None
-    try:
-        form_id, form_url = create_google_form(quiz.title, quiz.description, quiz.questions)
-    except Exception as e:
-        # Log the error but continue (we'll store the quiz without form data)
-        print(f"Error creating Google Form: {e}")
+    # Store the quiz right away and let a form worker create the Google Form
+    response_data = await create_quiz_in_db(db, quiz, form_status=FormStatus.PENDING)
+    enqueue_form(response_data["id"])
+    return QuizResponse(**response_data)
+
+FIELDS_DESCRIPTION = "Comma-separated QuizResponse fields to return, e.g. title,status,question_count"
+VIEW_DESCRIPTION = "summary leaves out the questions and includes question_count"
+
+@router.get("/quizzes/", response_model=QuizListResponse)
+async def get_quizzes(
+    response: Response,
+    status: Optional[QuizStatus] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned as next_cursor by the previous page"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    view: str = Query("full", pattern="^(full|summary)$", description=VIEW_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Get a page of quizzes, newest first, optionally filtered by status
+    """
+    selected = resolve_quiz_fields(fields, view)
     
-    # Store quiz in database
-    db_quiz = create_quiz_in_db(db, quiz, form_id, form_url)
+    # The count and newest update of the filtered set change whenever any listed quiz does
+    total, last_updated = await get_quiz_list_version(db, status)
+    etag = make_etag("list", status, limit, cursor, selected, total, last_updated)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_updated:
+        headers["Last-Modified"] = format_http_date(last_updated)
+    if is_not_modified(etag, last_updated, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
     
-    # Convert to response model
-    response_data = convert_db_quiz_to_response(db_quiz)
-    return QuizResponse(**response_data)
+    quizzes, next_cursor = await get_all_quizzes(db, status, limit, cursor)
+    data = await build_quiz_responses(db, quizzes, selected)
+    if selected is not None:
+        content = {"quizzes": data, "total": total, "next_cursor": next_cursor}
+        return JSONResponse(jsonable_encoder(content), headers=headers)
+    
+    response.headers.update(headers)
+    return QuizListResponse(
+        quizzes=[QuizResponse(**quiz) for quiz in data],
+        total=total,
+        next_cursor=next_cursor
+    )
+
+@router.get("/quizzes/search", response_model=QuizListResponse)
+async def search_quizzes(
+    q: str = Query(..., min_length=1, description="Words to look for in titles, descriptions and questions"),
+    status: Optional[QuizStatus] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor returned as next_cursor by the previous page"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Search quizzes by title, description and question text, best matches first
+    """
+    offset = decode_offset_cursor(cursor) if cursor else 0
+    quizzes, total = await search_quizzes_in_db(db, q, status, limit, offset)
+    next_offset = offset + len(quizzes)
+    return QuizListResponse(
+        quizzes=[QuizResponse(**data) for data in await hydrate_quiz_responses(db, quizzes)],
+        total=total,
+        next_cursor=encode_offset_cursor(next_offset) if next_offset < total else None
+    )
 
-@router.get("/quizzes/", response_model=List[QuizResponse])
-async def get_quizzes(status: Optional[QuizStatus] = Query(None), db: Session = Depends(get_db)):
+@router.get("/quizzes/stats", response_model=QuizStatsResponse)
+async def get_quiz_stats(db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Get the number of quizzes in each status
+    """
+    counts = await get_quiz_status_counts(db)
+    return QuizStatsResponse(counts=counts, total=total_for_status(counts))
+
+@router.get("/quizzes/batch", response_model=QuizBatchResponse)
+async def get_quiz_batch(
+    ids: List[str] = Query(..., description="Quiz IDs, as repeated parameters or comma-separated"),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Get several quizzes in one request, keyed by ID
+    """
+    quiz_ids = list(dict.fromkeys(quiz_id.strip() for value in ids for quiz_id in value.split(",") if quiz_id.strip()))
+    if len(quiz_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} quiz IDs can be requested at once")
+    
+    found = await get_quizzes_by_ids(db, quiz_ids)
+    quizzes = [found[quiz_id] for quiz_id in quiz_ids if quiz_id in found and found[quiz_id].status != QuizStatus.DELETED]
+    responses = {data["id"]: QuizResponse(**data) for data in await hydrate_quiz_responses(db, quizzes)}
+    return QuizBatchResponse(
+        quizzes={quiz_id: responses.get(quiz_id) for quiz_id in quiz_ids},
+        not_found=[quiz_id for quiz_id in quiz_ids if quiz_id not in responses]
+    )
+
+@router.post("/quizzes/bulk-delete", response_model=BulkOperationResponse)
+async def bulk_delete_quizzes(bulk: BulkQuizIds = Body(...), db: AsyncSession = Depends(get_async_db)):
+    """
+    Mark many quizzes as deleted in a single transaction
+    """
+    return await bulk_status_transition(db, bulk.ids, QuizStatus.DELETED)
+
+@router.post("/quizzes/bulk-status", response_model=BulkOperationResponse)
+async def bulk_update_status(bulk: BulkStatusUpdate = Body(...), db: AsyncSession = Depends(get_async_db)):
+    """
+    Move many quizzes to a new status in a single transaction
+
+    Approval sends invitation emails, so it is only available one quiz at a time.
+    """
+    if bulk.status == QuizStatus.APPROVED:
+        raise HTTPException(status_code=400, detail="Quizzes must be approved individually")
+    return await bulk_status_transition(db, bulk.ids, bulk.status)
+
+async def bulk_status_transition(db: AsyncSession, quiz_ids: List[str], new_status: QuizStatus):
+    """Apply a bulk status transition and summarize the per-quiz outcomes"""
+    if len(quiz_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} quizzes can be updated at once")
+    
+    results = await bulk_update_quiz_status(db, quiz_ids, new_status)
+    return BulkOperationResponse(
+        results=results,
+        updated=sum(1 for outcome in results.values() if outcome == "updated")
+    )
+
+@router.get("/quizzes/export")
+async def export_quizzes(
+    request: Request,
+    status: Optional[QuizStatus] = Query(None),
+    updated_since: Optional[datetime] = Query(None, description="Only export quizzes changed at or after this time"),
+):
+    """
+    Stream every quiz with its questions as newline-delimited JSON
+    """
+    return StreamingResponse(
+        stream_quiz_export(status, updated_since, session_factory=get_read_sessionmaker(request)),
+        media_type="application/x-ndjson"
+    )
+
+@router.post(
+    "/quizzes/import",
+    response_model=QuizImportResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string", "description": "One QuizCreate JSON object per line"}},
+                "application/json": {"schema": {"type": "array", "items": {"$ref": "#/components/schemas/QuizCreate"}}},
+            },
+        }
+    },
+)
+async def import_quizzes(
+    request: Request,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=MAX_IMPORT_BATCH_SIZE, description="Quizzes inserted per transaction"),
+    create_forms: bool = Query(False, description="Create a Google Form for every imported quiz in the background"),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get all quizzes, optionally filtered by status
+    Bulk-import quizzes from an NDJSON stream or a JSON array of QuizCreate records
+
+    Records are validated as they arrive; invalid ones are reported without
+    aborting the import.
     """
-    quizzes = get_all_quizzes(db, status)
-    return [QuizResponse(**convert_db_quiz_to_response(quiz)) for quiz in quizzes]
+    json_array = request.headers.get("content-type", "").startswith("application/json")
+    records = read_import_records(request.stream(), json_array)
+    imported, errors = await import_quizzes_in_db(db, records, batch_size, create_forms)
+    if create_forms:
+        await enqueue_pending_forms()
+    return QuizImportResponse(imported=imported, failed=len(errors), errors=errors)
 
 # This is a snippet to fix the approve_quiz route that was incorrectly named in the original code
 # The rest of the routes.py implementation remains the same as in the previous artifact
@@ -63,68 +250,174 @@ async def get_quizzes(status: Optional[QuizStatus] = Query(None), db: Session =
 async def approve_quiz(
     quiz_id: str = Path(...),
     email_data: EmailRecipients = Body(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Approve a quiz and send email notifications
     """
-    quiz = get_quiz_by_id(db, quiz_id)
+    # Claim the approval atomically so concurrent approvals can't both go through
+    quiz = await transition_quiz_status(
+        db, quiz_id, QuizStatus.APPROVED, [QuizStatus.DRAFT], QuizDB.form_url.isnot(None)
+    )
     if not quiz:
-        raise HTTPException(status_code=404, detail="Quiz not found")
-    
-    # Check if the quiz is in draft status
-    if quiz.status != QuizStatus.DRAFT:
-        raise HTTPException(status_code=400, detail="Only draft quizzes can be approved")
-    
-    # Send email notification
-    if not quiz.form_url:
+        quiz = await get_quiz_by_id(db, quiz_id)
+        if not quiz:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        if quiz.status != QuizStatus.DRAFT:
+            raise HTTPException(status_code=400, detail="Only draft quizzes can be approved")
+        if quiz.form_status in (FormStatus.PENDING, FormStatus.PROVISIONING):
+            raise HTTPException(status_code=409, detail="The Google Form is still being created")
         raise HTTPException(status_code=400, detail="Quiz does not have a valid Google Form URL")
     
-    email_sent = send_email_notification(
+    # Send email notification
+    email_sent = await run_google_call(
+        send_email_notification,
         email_data.recipients,
         quiz.title,
         quiz.form_url
     )
     
     if not email_sent:
+        # Hand the quiz back to draft so the approval can be retried
+        await transition_quiz_status(db, quiz_id, QuizStatus.DRAFT, [QuizStatus.APPROVED])
         raise HTTPException(status_code=500, detail="Failed to send email notifications")
     
-    # Update quiz status
-    updated_quiz = update_quiz_status(db, quiz_id, QuizStatus.APPROVED)
-    
-    return QuizResponse(**convert_db_quiz_to_response(updated_quiz))
+    return QuizResponse(**(await hydrate_quiz_responses(db, [quiz]))[0])
+
+@router.post("/quizzes/{quiz_id}/form", response_model=QuizResponse, status_code=202)
+async def retry_quiz_form(quiz_id: str = Path(...), db: AsyncSession = Depends(get_async_db)):
+    """
+    Queue Google Form creation again for a quiz whose form failed or was never requested
+    """
+    quiz = await request_quiz_form(db, quiz_id)
+    if not quiz:
+        version = await get_quiz_version(db, quiz_id)
+        if not version or version.status == QuizStatus.DELETED:
+            raise HTTPException(status_code=404, detail="Quiz not found")
+        raise HTTPException(status_code=409, detail="The quiz already has a Google Form or one is being created")
+    enqueue_form(quiz_id)
+    return QuizResponse(**(await hydrate_quiz_responses(db, [quiz]))[0])
 
 @router.get("/quizzes/{quiz_id}", response_model=QuizResponse)
-async def get_quiz(quiz_id: str = Path(...), db: Session = Depends(get_db)):
+async def get_quiz(
+    quiz_id: str = Path(...),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+    view: str = Query("full", pattern="^(full|summary)$", description=VIEW_DESCRIPTION),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db)
+):
     """
     Get details for a specific quiz
     """
-    quiz = get_quiz_by_id(db, quiz_id)
-    if not quiz or quiz.status == QuizStatus.DELETED:
+    selected = resolve_quiz_fields(fields, view)
+    version = await get_quiz_version(db, quiz_id)
+    if not version or version.status == QuizStatus.DELETED:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    return QuizResponse(**convert_db_quiz_to_response(quiz))
+    etag = make_etag(quiz_id, version.updated_at, selected)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_http_date(version.updated_at),
+        "Cache-Control": "no-cache"
+    }
+    if is_not_modified(etag, version.updated_at, if_none_match, if_modified_since):
+        return Response(status_code=304, headers=headers)
+    
+    if selected is not None:
+        quiz = await get_quiz_by_id(db, quiz_id)
+        data = (await build_quiz_responses(db, [quiz], selected))[0]
+        return JSONResponse(jsonable_encoder(data), headers=headers)
+    
+    # Serve the pre-serialized JSON unless the quiz changed since it was cached
+    content = get_cached_quiz_response(quiz_id, version.updated_at)
+    if content is None:
+        quiz = await get_quiz_by_id(db, quiz_id)
+        content = cache_quiz_response((await hydrate_quiz_responses(db, [quiz]))[0])
+    return Response(content=content, media_type="application/json", headers=headers)
 
 
 @router.delete("/quizzes/{quiz_id}", status_code=204)
-async def delete_quiz(quiz_id: str = Path(...), db: Session = Depends(get_db)):
+async def delete_quiz(quiz_id: str = Path(...), db: AsyncSession = Depends(get_async_db)):
     """
     Mark a quiz as deleted
     """
-    quiz = get_quiz_by_id(db, quiz_id)
-    if not quiz:
+    quiz = await transition_quiz_status(
+        db, quiz_id, QuizStatus.DELETED, ALLOWED_STATUS_TRANSITIONS[QuizStatus.DELETED]
+    )
+    # Deleting an already deleted quiz is a no-op, only unknown IDs are an error
+    if not quiz and not await get_quiz_version(db, quiz_id):
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    updated_quiz = update_quiz_status(db, quiz_id, QuizStatus.DELETED)
+    return Response(status_code=204)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Only let requests carrying ADMIN_TOKEN through; admin routes are off when it isn't set"""
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.post("/admin/snapshots", response_model=SnapshotInfo, status_code=201, dependencies=[Depends(require_admin)])
+async def create_database_snapshot():
+    """
+    Take an online snapshot of the database and prune old ones
+    """
+    try:
+        snapshot = await run_in_threadpool(maintenance.create_snapshot)
+        await run_in_threadpool(maintenance.prune_snapshots)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return snapshot
+
+@router.get("/admin/snapshots", response_model=SnapshotListResponse, dependencies=[Depends(require_admin)])
+async def list_database_snapshots():
+    """
+    List the database snapshots, newest first
+    """
+    return {"snapshots": await run_in_threadpool(maintenance.list_snapshots)}
+
+@router.post("/admin/snapshots/{name}/restore", response_model=SnapshotInfo, dependencies=[Depends(require_admin)])
+async def restore_database_snapshot(name: str = Path(...)):
+    """
+    Replace the live database with a snapshot
+    """
+    try:
+        snapshot = await run_in_threadpool(maintenance.restore_snapshot, name)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await async_engine.dispose()
+    await read_async_engine.dispose()
+    clear_quiz_responses()
+    return snapshot
+
+@router.post("/admin/purge", response_model=PurgeResponse, dependencies=[Depends(require_admin)])
+async def purge_expired_quizzes(
+    retention_days: int = Query(maintenance.PURGE_RETENTION_DAYS, ge=0, description="Purge quizzes deleted longer ago than this")
+):
+    """
+    Permanently remove expired deleted quizzes and shrink the database file
+    """
+    try:
+        purged_ids, freed_questions = await run_in_threadpool(maintenance.purge_deleted_quizzes, retention_days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    invalidate_quiz_responses(purged_ids)
+    released_pages = await run_in_threadpool(maintenance.incremental_vacuum)
+    return {"purged": len(purged_ids), "freed_questions": freed_questions, "released_pages": released_pages}
 
-    return QuizResponse(**convert_db_quiz_to_response(updated_quiz))
 @router.get("/quizdetails/{form_id}", response_model=List[Question])
 async def get_form_details(form_id: str = Path(...)):
     """
     Get individual questions, options, and answers from a Google Form by its ID
     """
     try:
-        questions = get_google_form_details(form_id)
+        questions = await run_google_call(get_google_form_details, form_id)
         
         # Convert to Pydantic models
         pydantic_questions = []
@@ -154,7 +447,7 @@ class QuizTextInput(BaseModel):
 async def create_quiz_from_file(
     file: UploadFile = File(...),
     suggested_title: Optional[str] = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new quiz by uploading a text file
@@ -171,25 +464,15 @@ async def create_quiz_from_file(
     # Parse quiz from content using Gemini
     quiz_data = await parse_quiz_with_gemini(file_content, suggested_title)
     
-    # Create Google Form
-    form_id, form_url = None, None
-    try:
-        form_id, form_url = create_google_form(quiz_data.title, quiz_data.description, quiz_data.questions)
-    except Exception as e:
-        # Log the error but continue (we'll store the quiz without form data)
-        print(f"Error creating Google Form: {e}")
-    
-    # Store quiz in database
-    db_quiz = create_quiz_in_db(db, quiz_data, form_id, form_url)
-    
-    # Convert to response model
-    response_data = convert_db_quiz_to_response(db_quiz)
+    # Store the quiz right away and let a form worker create the Google Form
+    response_data = await create_quiz_in_db(db, quiz_data, form_status=FormStatus.PENDING)
+    enqueue_form(response_data["id"])
     return QuizResponse(**response_data)
 
 @router.post("/quizzes/from-text", response_model=QuizResponse, status_code=200)
 async def create_quiz_from_text(
     quiz_text: QuizTextInput,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a quiz from text input
@@ -199,19 +482,9 @@ async def create_quiz_from_text(
     # Parse quiz from content using Gemini
     quiz_data = await parse_quiz_with_gemini(quiz_text.text, quiz_text.suggested_title)
     
-    # Create Google Form
-    form_id, form_url = None, None
-    try:
-        form_id, form_url = create_google_form(quiz_data.title, quiz_data.description, quiz_data.questions)
-    except Exception as e:
-        # Log the error but continue (we'll store the quiz without form data)
-        print(f"Error creating Google Form: {e}")
-    
-    # Store quiz in database
-    db_quiz = create_quiz_in_db(db, quiz_data, form_id, form_url)
-    
-    # Convert to response model
-    response_data = convert_db_quiz_to_response(db_quiz)
+    # Store the quiz right away and let a form worker create the Google Form
+    response_data = await create_quiz_in_db(db, quiz_data, form_status=FormStatus.PENDING)
+    enqueue_form(response_data["id"])
     return QuizResponse(**response_data)
 def custom_openapi(app):
     """
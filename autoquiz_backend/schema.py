@@ -16,6 +16,16 @@ __all__ = [
     "OpenAPISchema",
     "QuizTextInput",
     "QuizListResponse",
+    "QuizBatchResponse",
+    "BulkQuizIds",
+    "BulkStatusUpdate",
+    "BulkOperationResponse",
+    "QuizImportError",
+    "QuizImportResponse",
+    "QuizStatsResponse",
+    "SnapshotInfo",
+    "SnapshotListResponse",
+    "PurgeResponse",
     "ErrorResponse"
 ]
 
@@ -37,6 +47,7 @@ class QuizListResponse(BaseModel):
     """Response model for listing quizzes"""
     quizzes: List[QuizResponse] = Field(..., description="List of quizzes")
     total: int = Field(..., description="Total number of quizzes")
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page, or null on the last page")
     
     class Config:
         schema_extra = {
@@ -53,7 +64,127 @@ class QuizListResponse(BaseModel):
                         "updated_at": "2023-01-01T12:00:00"
                     }
                 ],
-                "total": 1
+                "total": 1,
+                "next_cursor": None
+            }
+        }
+
+class QuizBatchResponse(BaseModel):
+    """Response model for fetching several quizzes by ID"""
+    quizzes: Dict[str, Optional[QuizResponse]] = Field(..., description="Requested quizzes keyed by ID, null when not found")
+    not_found: List[str] = Field(..., description="Requested IDs that don't exist or were deleted")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "quizzes": {
+                    "550e8400-e29b-41d4-a716-446655440000": {
+                        "id": "550e8400-e29b-41d4-a716-446655440000",
+                        "title": "Python Basics",
+                        "description": "Test your knowledge of Python",
+                        "status": "draft",
+                        "form_url": "https://docs.google.com/forms/d/example/edit",
+                        "form_id": "example",
+                        "created_at": "2023-01-01T12:00:00",
+                        "updated_at": "2023-01-01T12:00:00",
+                        "questions": []
+                    },
+                    "00000000-0000-0000-0000-000000000000": None
+                },
+                "not_found": ["00000000-0000-0000-0000-000000000000"]
+            }
+        }
+
+class BulkQuizIds(BaseModel):
+    """Request model for applying one operation to many quizzes"""
+    ids: List[str] = Field(..., min_length=1, description="IDs of the quizzes to operate on")
+
+class BulkStatusUpdate(BulkQuizIds):
+    """Request model for moving many quizzes to a new status"""
+    status: QuizStatus = Field(..., description="Status to move the quizzes to")
+
+class BulkOperationResponse(BaseModel):
+    """Response model for bulk operations on quizzes"""
+    results: Dict[str, str] = Field(..., description="Outcome per quiz ID: updated, unchanged, invalid_transition or not_found")
+    updated: int = Field(..., description="Number of quizzes that were changed")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "results": {
+                    "550e8400-e29b-41d4-a716-446655440000": "updated",
+                    "00000000-0000-0000-0000-000000000000": "not_found"
+                },
+                "updated": 1
+            }
+        }
+
+class QuizImportError(BaseModel):
+    """A record that could not be imported"""
+    record: int = Field(..., description="1-based position of the record in the import body")
+    detail: str = Field(..., description="Why the record was rejected")
+
+class QuizImportResponse(BaseModel):
+    """Response model for bulk quiz imports"""
+    imported: int = Field(..., description="Number of quizzes created")
+    failed: int = Field(..., description="Number of records that were rejected")
+    errors: List[QuizImportError] = Field(..., description="Rejected records")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "imported": 2,
+                "failed": 1,
+                "errors": [
+                    {"record": 2, "detail": "1 validation error for QuizCreate\ntitle\n  Field required"}
+                ]
+            }
+        }
+
+class QuizStatsResponse(BaseModel):
+    """Response model for quiz totals"""
+    counts: Dict[QuizStatus, int] = Field(..., description="Number of quizzes in each status")
+    total: int = Field(..., description="Number of quizzes that aren't deleted")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "counts": {"draft": 12, "approved": 30, "deleted": 4},
+                "total": 42
+            }
+        }
+
+class SnapshotInfo(BaseModel):
+    """A database snapshot in the backup directory"""
+    name: str = Field(..., description="File name of the snapshot")
+    size_bytes: int = Field(..., description="Size of the snapshot file")
+    created_at: datetime = Field(..., description="When the snapshot was taken")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "name": "autoforms-20250101T020000.db",
+                "size_bytes": 1048576,
+                "created_at": "2025-01-01T02:00:00"
+            }
+        }
+
+class SnapshotListResponse(BaseModel):
+    """Response model for the list of database snapshots"""
+    snapshots: List[SnapshotInfo] = Field(..., description="Snapshots, newest first")
+
+class PurgeResponse(BaseModel):
+    """Response model for a purge of deleted quizzes"""
+    purged: int = Field(..., description="Number of quizzes permanently removed")
+    freed_questions: int = Field(..., description="Number of bank questions no quiz used any more")
+    released_pages: int = Field(..., description="Database pages handed back to the filesystem")
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "purged": 120,
+                "freed_questions": 840,
+                "released_pages": 310
             }
         }
 
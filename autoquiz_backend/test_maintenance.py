@@ -0,0 +1,56 @@
+# test_maintenance.py - Snapshots of a database that is being written to
+import sqlite3
+import threading
+import time
+import pytest
+from maintenance import copy_database, create_snapshot
+
+def make_database(path, journal_mode, rows=2000):
+    connection = sqlite3.connect(path)
+    connection.execute(f"PRAGMA journal_mode={journal_mode}")
+    connection.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT)")
+    connection.executemany("INSERT INTO notes (body) VALUES (?)", [("x" * 1000,)] * rows)
+    connection.commit()
+    connection.close()
+
+def start_writer(path, stop):
+    """Commit a row every few milliseconds until `stop` is set"""
+    def write():
+        connection = sqlite3.connect(path, timeout=5)
+        while not stop.is_set():
+            connection.execute("INSERT INTO notes (body) VALUES ('new')")
+            connection.commit()
+            time.sleep(0.002)
+        connection.close()
+    writer = threading.Thread(target=write)
+    writer.start()
+    return writer
+
+def test_snapshot_finishes_while_the_database_is_written_to(tmp_path):
+    source = str(tmp_path / "live.db")
+    make_database(source, "WAL")
+    stop = threading.Event()
+    writer = start_writer(source, stop)
+    try:
+        started = time.monotonic()
+        snapshot = create_snapshot(source, backup_dir=str(tmp_path / "backups"))
+        elapsed = time.monotonic() - started
+    finally:
+        stop.set()
+        writer.join()
+    assert elapsed < 10
+    copy = sqlite3.connect(str(tmp_path / "backups" / snapshot["name"]))
+    assert copy.execute("SELECT count(*) FROM notes").fetchone()[0] >= 2000
+    copy.close()
+
+def test_stepwise_copy_gives_up_instead_of_restarting_forever(tmp_path):
+    source = str(tmp_path / "live.db")
+    make_database(source, "DELETE")
+    stop = threading.Event()
+    writer = start_writer(source, stop)
+    try:
+        with pytest.raises(TimeoutError):
+            copy_database(source, str(tmp_path / "copy.db"), pages=1, sleep=0.005, timeout=1)
+    finally:
+        stop.set()
+        writer.join()
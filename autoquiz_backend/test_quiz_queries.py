@@ -0,0 +1,43 @@
+# test_quiz_queries.py - Query counts of the quiz list route
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from main import app
+from models import async_engine, read_async_engine
+
+client = TestClient(app)
+
+def create_quizzes(count, questions_per_quiz=3):
+    for index in range(count):
+        response = client.post("/quizzes/", json={
+            "title": f"Quiz {index}",
+            "questions": [
+                {"text": f"Quiz {index} question {number}", "options": ["a", "b"], "correct_answer_index": 1}
+                for number in range(questions_per_quiz)
+            ],
+        })
+        assert response.status_code == 201, response.text
+
+def count_list_queries(limit):
+    """Number of SQL statements GET /quizzes/ runs for a page of `limit` quizzes"""
+    statements = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = {async_engine.sync_engine, read_async_engine.sync_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/quizzes/", params={"limit": limit})
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200, response.text
+    quizzes = response.json()["quizzes"]
+    assert len(quizzes) == limit
+    assert all(len(quiz["questions"]) == 3 for quiz in quizzes)
+    return len(statements)
+
+def test_list_query_count_does_not_grow_with_page_size():
+    create_quizzes(12)
+    assert count_list_queries(2) == count_list_queries(12)
@@ -25,6 +25,8 @@ export function QuizCard({ quiz, selectionMode }: QuizCardProps) {
     return format(date, 'MMM d, yyyy');
   };
 
+  const questionCount = quiz.question_count ?? quiz.questions?.length ?? 0;
+
   return (
     <Card className={`h-full flex flex-col hover:shadow-md transition-shadow duration-200 ${selectionMode ? 'opacity-90' : ''}`}>
       <CardHeader>
@@ -44,7 +46,7 @@ export function QuizCard({ quiz, selectionMode }: QuizCardProps) {
           <span>Created: {formatDate(quiz.created_at)}</span>
         </div>
         <div className="mt-2 text-sm">
-          <span className="font-medium">{quiz.questions?.length || 0}</span> question{quiz.questions?.length !== 1 ? 's' : ''}
+          <span className="font-medium">{questionCount}</span> question{questionCount !== 1 ? 's' : ''}
         </div>
       </CardContent>
       <CardFooter>
@@ -1,8 +1,8 @@
 
 import React, { useState } from 'react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { fetchQuizzes, bulkDeleteQuizzes } from '@/services/api';
-import { QuizStatus, Quiz } from '@/types/quiz';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { fetchQuizPage, bulkDeleteQuizzes } from '@/services/api';
+import { QuizStatus } from '@/types/quiz';
 import { QuizCard } from '@/components/QuizCard';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import { Separator } from '@/components/ui/separator';
@@ -22,10 +22,13 @@ const Dashboard = () => {
   const { theme, setTheme } = useTheme();
   const queryClient = useQueryClient();
   
-  const { data: quizzes, isLoading, error } = useQuery({
+  const { data, isLoading, error, hasNextPage, fetchNextPage, isFetchingNextPage } = useInfiniteQuery({
     queryKey: ['quizzes', activeStatus],
-    queryFn: () => activeStatus === 'all' ? fetchQuizzes() : fetchQuizzes(activeStatus),
+    queryFn: ({ pageParam }) => fetchQuizPage(activeStatus === 'all' ? undefined : activeStatus, pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.next_cursor ?? undefined,
   });
+  const quizzes = data?.pages.flatMap(page => page.quizzes);
 
   const deleteQuizzesMutation = useMutation({
     mutationFn: bulkDeleteQuizzes,
@@ -173,25 +176,38 @@ const Dashboard = () => {
               ))}
             </div>
           ) : quizzes && quizzes.length > 0 ? (
-            <div className="quiz-card-grid">
-              {quizzes.map((quiz) => (
-                <div key={quiz.id} className="relative">
-                  {selectionMode && (
-                    <div className="absolute left-2 top-2 z-10">
-                      <Checkbox 
-                        checked={selectedQuizzes.includes(quiz.id)} 
-                        onCheckedChange={() => toggleQuizSelection(quiz.id)}
-                        className="h-5 w-5 bg-white/80 backdrop-blur"
-                      />
-                    </div>
-                  )}
-                  <QuizCard 
-                    quiz={quiz} 
-                    selectionMode={selectionMode}
-                  />
+            <>
+              <div className="quiz-card-grid">
+                {quizzes.map((quiz) => (
+                  <div key={quiz.id} className="relative">
+                    {selectionMode && (
+                      <div className="absolute left-2 top-2 z-10">
+                        <Checkbox 
+                          checked={selectedQuizzes.includes(quiz.id)} 
+                          onCheckedChange={() => toggleQuizSelection(quiz.id)}
+                          className="h-5 w-5 bg-white/80 backdrop-blur"
+                        />
+                      </div>
+                    )}
+                    <QuizCard 
+                      quiz={quiz} 
+                      selectionMode={selectionMode}
+                    />
+                  </div>
+                ))}
+              </div>
+              {hasNextPage && (
+                <div className="flex justify-center mt-6">
+                  <Button
+                    variant="outline"
+                    onClick={() => fetchNextPage()}
+                    disabled={isFetchingNextPage}
+                  >
+                    {isFetchingNextPage ? 'Loading...' : 'Load more'}
+                  </Button>
                 </div>
-              ))}
-            </div>
+              )}
+            </>
           ) : (
             <div className="text-center p-12">
               <h3 className="text-lg font-medium">No quizzes found</h3>
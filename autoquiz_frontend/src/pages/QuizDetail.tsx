@@ -3,7 +3,7 @@ import React, { useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { fetchQuizById, approveQuiz, deleteQuiz } from '@/services/api';
-import { QuizStatus, EmailRecipients } from '@/types/quiz';
+import { QuizStatus, FormStatus, EmailRecipients } from '@/types/quiz';
 import { Button } from '@/components/ui/button';
 import {
   Card,
@@ -216,6 +216,14 @@ const QuizDetail = () => {
                 <ExternalLink className="h-3 w-3" />
               </a>
             </div>
+          ) : quiz.form_status === FormStatus.PENDING || quiz.form_status === FormStatus.PROVISIONING ? (
+            <Alert>
+              <AlertCircle className="h-4 w-4" />
+              <AlertTitle>Form is being created</AlertTitle>
+              <AlertDescription>
+                The Google Form for this quiz is still being created. Refresh in a moment.
+              </AlertDescription>
+            </Alert>
           ) : (
             <Alert>
               <AlertCircle className="h-4 w-4" />
@@ -1,14 +1,18 @@
 
-import { Quiz, QuizCreate, QuizStatus, EmailRecipients } from '@/types/quiz';
+import { Quiz, QuizCreate, QuizStatus, EmailRecipients, QuizListResponse, QuizBatchResponse, BulkOperationResponse } from '@/types/quiz';
 
+// Every call sends credentials so the API's recent-write cookie comes back
+// and reads right after a write are served from the primary database
 const API_URL = 'http://localhost:8000';
 
-export const fetchQuizzes = async (status?: QuizStatus): Promise<Quiz[]> => {
-  const url = status
-    ? `${API_URL}/quizzes/?status=${status}`
-    : `${API_URL}/quizzes/`;
+export const fetchQuizPage = async (status?: QuizStatus, cursor?: string, limit?: number): Promise<QuizListResponse> => {
+  // Dashboard cards only need the summary, not every question
+  const params = new URLSearchParams({ view: 'summary' });
+  if (status) params.set('status', status);
+  if (cursor) params.set('cursor', cursor);
+  if (limit) params.set('limit', String(limit));
   
-  const response = await fetch(url);
+  const response = await fetch(`${API_URL}/quizzes/?${params.toString()}`, { credentials: 'include' });
   
   if (!response.ok) {
     throw new Error(`Error fetching quizzes: ${response.statusText}`);
@@ -17,8 +21,33 @@ export const fetchQuizzes = async (status?: QuizStatus): Promise<Quiz[]> => {
   return await response.json();
 };
 
+export const fetchQuizzes = async (status?: QuizStatus): Promise<Quiz[]> => {
+  // Follow the cursors so callers get every quiz, not just the first page
+  const quizzes: Quiz[] = [];
+  let cursor: string | undefined;
+  do {
+    const page = await fetchQuizPage(status, cursor);
+    quizzes.push(...page.quizzes);
+    cursor = page.next_cursor ?? undefined;
+  } while (cursor);
+  return quizzes;
+};
+
+export const searchQuizzes = async (q: string, cursor?: string): Promise<QuizListResponse> => {
+  const params = new URLSearchParams({ q });
+  if (cursor) params.set('cursor', cursor);
+  
+  const response = await fetch(`${API_URL}/quizzes/search?${params.toString()}`, { credentials: 'include' });
+  
+  if (!response.ok) {
+    throw new Error(`Error searching quizzes: ${response.statusText}`);
+  }
+  
+  return await response.json();
+};
+
 export const fetchQuizById = async (id: string): Promise<Quiz> => {
-  const response = await fetch(`${API_URL}/quizzes/${id}`);
+  const response = await fetch(`${API_URL}/quizzes/${id}`, { credentials: 'include' });
   
   if (!response.ok) {
     throw new Error(`Error fetching quiz: ${response.statusText}`);
@@ -27,9 +56,23 @@ export const fetchQuizById = async (id: string): Promise<Quiz> => {
   return await response.json();
 };
 
+export const fetchQuizzesByIds = async (ids: string[]): Promise<QuizBatchResponse> => {
+  const params = new URLSearchParams();
+  ids.forEach((id) => params.append('ids', id));
+  
+  const response = await fetch(`${API_URL}/quizzes/batch?${params.toString()}`, { credentials: 'include' });
+  
+  if (!response.ok) {
+    throw new Error(`Error fetching quizzes: ${response.statusText}`);
+  }
+  
+  return await response.json();
+};
+
 export const createQuiz = async (quiz: QuizCreate): Promise<Quiz> => {
   const response = await fetch(`${API_URL}/quizzes/`, {
     method: 'POST',
+    credentials: 'include',
     headers: {
       'Content-Type': 'application/json',
     },
@@ -47,6 +90,7 @@ export const createQuiz = async (quiz: QuizCreate): Promise<Quiz> => {
 export const createQuizFromFile = async (formData: FormData): Promise<Quiz> => {
   const response = await fetch(`${API_URL}/quizzes/from-file`, {
     method: 'POST',
+    credentials: 'include',
     body: formData,
   });
   
@@ -61,6 +105,7 @@ export const createQuizFromFile = async (formData: FormData): Promise<Quiz> => {
 export const createQuizFromText = async (text: string, suggestedTitle?: string): Promise<Quiz> => {
   const response = await fetch(`${API_URL}/quizzes/from-text`, {
     method: 'POST',
+    credentials: 'include',
     headers: {
       'Content-Type': 'application/json',
     },
@@ -81,6 +126,7 @@ export const createQuizFromText = async (text: string, suggestedTitle?: string):
 export const approveQuiz = async (quizId: string, emailData: EmailRecipients): Promise<Quiz> => {
   const response = await fetch(`${API_URL}/quizzes/${quizId}/approve`, {
     method: 'POST',
+    credentials: 'include',
     headers: {
       'Content-Type': 'application/json',
     },
@@ -98,6 +144,7 @@ export const approveQuiz = async (quizId: string, emailData: EmailRecipients): P
 export const deleteQuiz = async (quizId: string): Promise<void> => {
   const response = await fetch(`${API_URL}/quizzes/${quizId}`, {
     method: 'DELETE',
+    credentials: 'include',
   });
   
   if (!response.ok) {
@@ -105,9 +152,20 @@ export const deleteQuiz = async (quizId: string): Promise<void> => {
   }
 };
 
-export const bulkDeleteQuizzes = async (quizIds: string[]): Promise<void> => {
-  // Since the backend doesn't have a batch delete endpoint, we'll do it sequentially
-  for (const id of quizIds) {
-    await deleteQuiz(id);
+export const bulkDeleteQuizzes = async (quizIds: string[]): Promise<BulkOperationResponse> => {
+  const response = await fetch(`${API_URL}/quizzes/bulk-delete`, {
+    method: 'POST',
+    credentials: 'include',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ ids: quizIds }),
+  });
+  
+  if (!response.ok) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(`Error deleting quizzes: ${JSON.stringify(errorData)}`);
   }
+  
+  return await response.json();
 };
@@ -5,6 +5,13 @@ export enum QuizStatus {
   DELETED = "deleted"
 }
 
+export enum FormStatus {
+  PENDING = "pending",
+  PROVISIONING = "provisioning",
+  READY = "ready",
+  FAILED = "failed"
+}
+
 export interface Question {
   text: string;
   options: string[];
@@ -24,11 +31,29 @@ export interface Quiz {
   status: QuizStatus;
   form_url?: string;
   form_id?: string;
+  form_status?: FormStatus | null;
   created_at: string;
   updated_at: string;
   questions: Question[];
+  question_count?: number;
 }
 
 export interface EmailRecipients {
   recipients: string[];
 }
+
+export interface QuizListResponse {
+  quizzes: Quiz[];
+  total: number;
+  next_cursor?: string | null;
+}
+
+export interface QuizBatchResponse {
+  quizzes: Record<string, Quiz | null>;
+  not_found: string[];
+}
+
+export interface BulkOperationResponse {
+  results: Record<string, 'updated' | 'unchanged' | 'invalid_transition' | 'not_found'>;
+  updated: number;
+}